@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+
+from books.models import Book
+from books.utils.cache import invalidate_book_cache
+
+
+class BookUnavailableError(Exception):
+    """Raised when no copies of a book are left to reserve"""
+    pass
+
+
+def reserve_book(book_id: int) -> None:
+    """
+    Take one copy of a book out of the inventory.
+
+    A single conditional ``UPDATE ... WHERE inventory > 0`` does the
+    check and the decrement, so concurrent borrowers cannot oversell.
+    Raises:
+        BookUnavailableError: If the book has no copies left
+    """
+    reserved = Book.objects.filter(
+        pk=book_id,
+        inventory__gt=0
+    ).update(
+        inventory=F("inventory") - 1,
+        updated_at=Now()
+    )
+    if not reserved:
+        raise BookUnavailableError(
+            "Sorry, the book is currently unavailable for borrowing"
+        )
+    transaction.on_commit(invalidate_book_cache)
+
+
+def release_book(book_id: int) -> None:
+    """Put one copy of a book back into the inventory."""
+    Book.objects.filter(pk=book_id).update(
+        inventory=F("inventory") + 1,
+        updated_at=Now()
+    )
+    transaction.on_commit(invalidate_book_cache)
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from books.utils.book_import import (
+    IMPORT_FORMATS,
+    BookImportError,
+    detect_format,
+    import_books,
+)
+
+
+class Command(BaseCommand):
+    help = "Import books from a CSV or JSONL file in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to a CSV or JSONL file")
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            help="File format, detected from the extension by default",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.BOOK_IMPORT_CHUNK_SIZE,
+            help="Rows validated and inserted per transaction",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            file_format = options["format"] or detect_format(path)
+            with open(path, encoding="utf-8-sig", newline="") as lines:
+                summary = import_books(
+                    lines,
+                    file_format=file_format,
+                    chunk_size=options["chunk_size"],
+                )
+        except (BookImportError, OSError) as e:
+            raise CommandError(str(e))
+
+        for error in summary["errors"]:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {summary['created']} books, "
+            f"skipped {summary['duplicates']} duplicates "
+            f"and {summary['invalid']} invalid rows."
+        ))
@@ -1,6 +1,13 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 
+from books.utils.cache import invalidate_book_cache
+
+
+SEARCH_CONFIG = "english"
+
 
 class Book(models.Model):
     class CoverType(models.TextChoices):
@@ -12,6 +19,28 @@ class Book(models.Model):
     cover = models.CharField(max_length=4, choices=CoverType.choices)
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=5, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector("title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("author", weight="B", config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="book_search_vector_idx"),
+            GinIndex(
+                OpClass("title", name="gin_trgm_ops"),
+                name="book_title_trgm_idx",
+            ),
+            GinIndex(
+                OpClass("author", name="gin_trgm_ops"),
+                name="book_author_trgm_idx",
+            ),
+        ]
 
     def clean(self):
         if self.inventory < 0:
@@ -27,6 +56,12 @@ class Book(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
+        transaction.on_commit(invalidate_book_cache)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(invalidate_book_cache)
+        return result
 
     def __str__(self):
         return f"{self.title} by {self.author}"
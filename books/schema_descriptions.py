@@ -1,10 +1,24 @@
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from books.serializers import BookReadSerializer, BookCreateSerializer
 
 
 book_list_schema = extend_schema(
     summary="Get list of books",
-    description="Return a list of all books in the library.",
+    description=(
+        "Return a paginated list of books ordered by ID.\n\n"
+        "Pagination:\n"
+        "- Follow the **next** / **previous** links to move between pages\n"
+        "- **page_size** sets the number of books per page "
+        "(limited by the server maximum)\n\n"
+        "Searching:\n"
+        "- **search** matches words of the title and author by prefix "
+        "(e.g. `tolk ring`)\n"
+        "- **fuzzy** tolerates typos in the title or author "
+        "(e.g. `tolkein`) and orders matches by similarity\n"
+        "- Search results are ordered by relevance and paginated "
+        "with **page** instead of a cursor"
+    ),
     responses={200: BookReadSerializer(many=True)},
 )
 
@@ -53,3 +67,52 @@ book_destroy_schema = extend_schema(
     description="Admins only. Permanently delete a book by its ID.",
     responses={204: None},
 )
+
+book_import_schema = extend_schema(
+    summary="Bulk import books",
+    description=(
+        "Admins only. Upload a CSV or JSONL file with one book per row "
+        "using the same fields as book creation.\n\n"
+        "- The format is taken from **file_format** or the file extension\n"
+        "- Rows are validated and inserted in chunks\n"
+        "- Rows matching an existing **title** and **author** are skipped\n"
+        "- Invalid rows are skipped and reported with their row number\n"
+        "- A file that is not UTF-8 text or not parseable CSV is "
+        "rejected with 400"
+    ),
+    request={
+        "multipart/form-data": {
+            "type": "object",
+            "properties": {
+                "file": {"type": "string", "format": "binary"},
+                "file_format": {"type": "string", "enum": ["csv", "jsonl"]},
+            },
+            "required": ["file"],
+        }
+    },
+    responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+)
+
+book_export_schema = extend_schema(
+    summary="Export the book catalog",
+    description=(
+        "Admins only. Stream every book as CSV or NDJSON using the "
+        "same fields as the book list.\n\n"
+        "- Rows are read through a database cursor and sent as they "
+        "are produced, so any catalog size can be exported"
+    ),
+    parameters=[
+        OpenApiParameter(
+            name="file_format",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            enum=["csv", "ndjson"],
+            description="Export format (default: csv)",
+        ),
+    ],
+    responses={
+        (200, "text/csv"): OpenApiTypes.STR,
+        (200, "application/x-ndjson"): OpenApiTypes.STR,
+        400: OpenApiTypes.OBJECT,
+    },
+)
@@ -4,6 +4,8 @@ from books.models import Book
 
 
 class BookCreateSerializer(serializers.ModelSerializer):
+    check_duplicates = True
+
     class Meta:
         model = Book
         fields = ("id", "title", "author", "cover", "inventory", "daily_fee")
@@ -24,7 +26,7 @@ class BookCreateSerializer(serializers.ModelSerializer):
                 {"daily_fee": "Daily fee must be a positive number."}
             )
 
-        if title and author:
+        if self.check_duplicates and title and author:
             if Book.objects.filter(title=title, author=author).exists():
                 raise serializers.ValidationError(
                     {
@@ -48,6 +50,12 @@ class BookCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(e.message_dict)
 
 
+class BookImportSerializer(BookCreateSerializer):
+    """Row validation for bulk imports, which find duplicates per chunk."""
+
+    check_duplicates = False
+
+
 class BookReadSerializer(serializers.ModelSerializer):
     daily_fee = serializers.SerializerMethodField()
 
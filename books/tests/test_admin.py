@@ -1,9 +1,18 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
 from rest_framework import status
 
 from books.models import Book
 from books.tests.test_base import (
     BaseApiTestCase,
     BOOKS_URL,
+    BOOKS_IMPORT_URL,
+    BOOKS_EXPORT_URL,
     sample_book,
     detail_book_url,
     sample_book_payload
@@ -119,3 +128,148 @@ class BookAdminTests(BaseApiTestCase):
         res_patch = self.client.patch(detail_book_url(book.id), payload)
         self.assertEqual(res_patch.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("daily_fee", res_patch.data)
+
+    def test_import_books_csv(self):
+        sample_book(title="Existing", author="John Doe")
+        content = (
+            "title,author,cover,inventory,daily_fee\n"
+            "Existing,John Doe,HARD,1,1.00\n"
+            "First,Jane Roe,SOFT,3,2.50\n"
+            "Second,Jane Roe,HARD,0,2.50\n"
+            "Third,Jane Roe,HARD,2,1.25\n"
+        )
+        upload = SimpleUploadedFile("books.csv", content.encode())
+
+        res = self.client.post(
+            BOOKS_IMPORT_URL, {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(res.data["duplicates"], 1)
+        self.assertEqual(res.data["invalid"], 1)
+        self.assertEqual(res.data["errors"][0]["row"], 3)
+        self.assertIn("inventory", res.data["errors"][0]["errors"])
+        self.assertEqual(
+            set(Book.objects.values_list("title", flat=True)),
+            {"Existing", "First", "Third"}
+        )
+
+    def test_import_books_jsonl_skips_duplicates_within_file(self):
+        row = sample_book_payload(title="Repeated")
+        lines = [json.dumps(row), json.dumps(row), "not json"]
+        upload = SimpleUploadedFile(
+            "books.jsonl", "\n".join(lines).encode()
+        )
+
+        res = self.client.post(
+            BOOKS_IMPORT_URL, {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 1)
+        self.assertEqual(res.data["duplicates"], 1)
+        self.assertEqual(res.data["invalid"], 1)
+        self.assertEqual(Book.objects.filter(title="Repeated").count(), 1)
+
+    def test_import_books_unsupported_format(self):
+        upload = SimpleUploadedFile("books.xml", b"<books/>")
+
+        res = self.client.post(
+            BOOKS_IMPORT_URL, {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_books_latin1_file(self):
+        content = (
+            "title,author,cover,inventory,daily_fee\n"
+            "Café,Jane Roe,SOFT,3,2.50\n"
+        )
+        upload = SimpleUploadedFile("books.csv", content.encode("latin-1"))
+
+        res = self.client.post(
+            BOOKS_IMPORT_URL, {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("UTF-8", res.data["file"])
+        self.assertFalse(Book.objects.exists())
+
+    def test_import_books_command_latin1_file(self):
+        with tempfile.NamedTemporaryFile(
+                "w", suffix=".csv", encoding="latin-1", delete=False
+        ) as import_file:
+            import_file.write("title,author\nCafé,Jane Roe\n")
+        self.addCleanup(os.remove, import_file.name)
+
+        with self.assertRaisesMessage(CommandError, "UTF-8"):
+            call_command("import_books", import_file.name)
+
+    def test_import_books_command(self):
+        with tempfile.NamedTemporaryFile(
+                "w", suffix=".jsonl", delete=False
+        ) as import_file:
+            for i in range(5):
+                import_file.write(
+                    json.dumps(sample_book_payload(title=f"Book {i}")) + "\n"
+                )
+        self.addCleanup(os.remove, import_file.name)
+
+        out = StringIO()
+        call_command(
+            "import_books", import_file.name, "--chunk-size", "2", stdout=out
+        )
+
+        self.assertEqual(Book.objects.count(), 5)
+        self.assertIn("Created 5 books", out.getvalue())
+
+    def test_export_books_csv(self):
+        first = sample_book(title="First", daily_fee=2.5)
+        second = sample_book(title="Second")
+
+        res = self.client.get(BOOKS_EXPORT_URL)
+        content = b"".join(res.streaming_content).decode()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "text/csv")
+        self.assertEqual(
+            content.splitlines(),
+            [
+                "id,title,author,cover,inventory,daily_fee",
+                f"{first.id},First,John Doe,HARD,5,$2.50",
+                f"{second.id},Second,John Doe,HARD,5,$10.00",
+            ]
+        )
+
+    def test_export_books_ndjson(self):
+        books = [sample_book(title=f"Book {i}") for i in range(3)]
+
+        res = self.client.get(BOOKS_EXPORT_URL, {"file_format": "ndjson"})
+        rows = [
+            json.loads(line)
+            for line in b"".join(res.streaming_content).splitlines()
+        ]
+
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertEqual([row["id"] for row in rows], [b.id for b in books])
+        self.assertEqual(rows[0]["daily_fee"], "$10.00")
+
+    def test_export_books_unknown_format(self):
+        res = self.client.get(BOOKS_EXPORT_URL, {"file_format": "xml"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_books_invalidates_cache(self):
+        self.client.get(BOOKS_URL)
+        upload = SimpleUploadedFile(
+            "books.jsonl", json.dumps(sample_book_payload()).encode()
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                BOOKS_IMPORT_URL, {"file": upload}, format="multipart"
+            )
+        res = self.client.get(BOOKS_URL)
+
+        self.assertEqual(len(res.data["results"]), 1)
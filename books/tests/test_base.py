@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
@@ -7,6 +8,8 @@ from books.models import Book
 User = get_user_model()
 
 BOOKS_URL = reverse("books:book-list")
+BOOKS_IMPORT_URL = reverse("books:book-import-books")
+BOOKS_EXPORT_URL = reverse("books:book-export-books")
 
 
 def detail_book_url(book_id):
@@ -35,6 +38,7 @@ def sample_book_payload(**params) -> dict:
 
 class BaseApiTestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
 
     def authenticate_user(self, is_admin=False):
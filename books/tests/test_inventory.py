@@ -0,0 +1,52 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from books.inventory_service import (
+    BookUnavailableError,
+    release_book,
+    reserve_book,
+)
+from books.models import Book
+
+
+class InventoryConcurrencyTest(TransactionTestCase):
+    workers = 20
+    inventory = 5
+
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            cover=Book.CoverType.HARD,
+            inventory=self.inventory,
+            daily_fee=1.00,
+        )
+
+    def test_concurrent_reservations_never_oversell(self):
+        barrier = threading.Barrier(self.workers)
+
+        def borrow():
+            try:
+                barrier.wait()
+                reserve_book(self.book.id)
+                return True
+            except BookUnavailableError:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda _: borrow(), range(self.workers)))
+
+        self.assertEqual(results.count(True), self.inventory)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_release_returns_copy(self):
+        reserve_book(self.book.id)
+        release_book(self.book.id)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, self.inventory)
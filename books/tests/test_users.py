@@ -1,10 +1,22 @@
+import warnings
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.paginator import UnorderedObjectListWarning
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TransactionTestCase
 from rest_framework import status
+from rest_framework.test import APIClient
 
 from books.models import Book
 from books.serializers import BookReadSerializer
+from books.utils.pagination import BookCursorPagination
 from books.tests.test_base import (
     BaseApiTestCase,
     BOOKS_URL,
+    BOOKS_IMPORT_URL,
+    BOOKS_EXPORT_URL,
     sample_book,
     detail_book_url,
     sample_book_payload
@@ -29,13 +41,43 @@ class BookTests(BaseApiTestCase):
         books = Book.objects.all()
         serializer_list = BookReadSerializer(books, many=True)
 
-        for book in res_list.data:
+        for book in res_list.data["results"]:
             daily_fee = book["daily_fee"]
             self.assertTrue(daily_fee.startswith("$"))
 
-        self.assertEqual(len(res_list.data), 2)
+        self.assertEqual(len(res_list.data["results"]), 2)
         self.assertEqual(res_list.status_code, status.HTTP_200_OK)
-        self.assertEqual(res_list.data, serializer_list.data)
+        self.assertEqual(res_list.data["results"], serializer_list.data)
+
+    def test_list_books_cursor_pagination(self):
+        books = [sample_book(title=f"Book {i}") for i in range(5)]
+
+        res_first = self.client.get(BOOKS_URL, {"page_size": 2})
+
+        self.assertEqual(res_first.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [book["id"] for book in res_first.data["results"]],
+            [book.id for book in books[:2]]
+        )
+        self.assertIsNone(res_first.data["previous"])
+        self.assertIn("cursor=", res_first.data["next"])
+
+        res_second = self.client.get(res_first.data["next"])
+
+        self.assertEqual(
+            [book["id"] for book in res_second.data["results"]],
+            [book.id for book in books[2:4]]
+        )
+
+    def test_list_books_page_size_is_capped(self):
+        for i in range(3):
+            sample_book(title=f"Book {i}")
+
+        with patch.object(BookCursorPagination, "max_page_size", 2):
+            res = self.client.get(BOOKS_URL, {"page_size": 1000})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 2)
 
     def test_detail_books(self):
         book = sample_book()
@@ -77,3 +119,183 @@ class BookTests(BaseApiTestCase):
 
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
         self.assertTrue(Book.objects.filter(id=book.id).exists())
+
+    def test_search_books_by_title_and_author_prefix(self):
+        hobbit = sample_book(title="The Hobbit", author="J. R. R. Tolkien")
+        sample_book(title="Dune", author="Frank Herbert")
+
+        res = self.client.get(BOOKS_URL, {"search": "tolk hobb"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 1)
+        self.assertEqual(res.data["results"][0]["id"], hobbit.id)
+
+    def test_search_books_ranks_title_matches_first(self):
+        by_author = sample_book(title="Collected Essays", author="Dune Fan")
+        by_title = sample_book(title="Dune", author="Frank Herbert")
+
+        res = self.client.get(BOOKS_URL, {"search": "dune"})
+
+        self.assertEqual(
+            [book["id"] for book in res.data["results"]],
+            [by_title.id, by_author.id]
+        )
+
+    def test_search_without_words_pages_in_stable_order(self):
+        books = [sample_book(title=f"Book {i}") for i in range(3)]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", UnorderedObjectListWarning)
+            res = self.client.get(BOOKS_URL, {"search": "!!"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [book["id"] for book in res.data["results"]],
+            [book.id for book in books]
+        )
+
+    def test_fuzzy_search_tolerates_misspelled_author(self):
+        hobbit = sample_book(title="The Hobbit", author="J. R. R. Tolkien")
+        sample_book(title="Dune", author="Frank Herbert")
+
+        res = self.client.get(BOOKS_URL, {"fuzzy": "tolkein"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [book["id"] for book in res.data["results"]],
+            [hobbit.id]
+        )
+
+    def test_fuzzy_search_orders_by_similarity(self):
+        close = sample_book(title="The Hobbit", author="Someone")
+        exact = sample_book(title="Hobbits", author="Someone Else")
+
+        res = self.client.get(BOOKS_URL, {"fuzzy": "hobbits"})
+
+        self.assertEqual(
+            [book["id"] for book in res.data["results"]],
+            [exact.id, close.id]
+        )
+
+    def test_fuzzy_search_threshold_is_configurable(self):
+        sample_book(title="The Hobbit", author="J. R. R. Tolkien")
+
+        with self.settings(BOOK_FUZZY_SEARCH_THRESHOLD=0.9):
+            res = self.client.get(BOOKS_URL, {"fuzzy": "tolkein"})
+
+        self.assertEqual(res.data["count"], 0)
+
+    def test_forbidden_import_books(self):
+        upload = SimpleUploadedFile(
+            "books.csv", b"title,author,cover,inventory,daily_fee\n"
+        )
+
+        res = self.client.post(
+            BOOKS_IMPORT_URL, {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_forbidden_export_books(self):
+        res = self.client.get(BOOKS_EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_list_books_served_from_cache(self):
+        sample_book()
+        self.client.get(BOOKS_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(BOOKS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_book_cache_invalidated_on_save_and_delete(self):
+        book = sample_book(inventory=5)
+        self.client.get(detail_book_url(book.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.inventory = 4
+            book.save()
+        res = self.client.get(detail_book_url(book.id))
+        self.assertEqual(res.data["inventory"], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        res = self.client.get(detail_book_url(book.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_books_not_modified(self):
+        sample_book()
+        res = self.client.get(BOOKS_URL)
+        etag = res["ETag"]
+
+        # A deleted row would not move Last-Modified, so lists only
+        # carry an ETag
+        self.assertFalse(res.has_header("Last-Modified"))
+
+        res = self.client.get(BOOKS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+
+        cache.clear()
+        res = self.client.get(BOOKS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        sample_book(title="Another Book")
+        cache.clear()
+        res = self.client.get(BOOKS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_list_books_etag_changes_when_book_deleted(self):
+        sample_book()
+        book = sample_book(title="Another Book")
+        etag = self.client.get(BOOKS_URL)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        res = self.client.get(BOOKS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_detail_book_if_modified_since(self):
+        book = sample_book()
+        res = self.client.get(detail_book_url(book.id))
+        last_modified = res["Last-Modified"]
+
+        res = self.client.get(
+            detail_book_url(book.id), HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class BookFuzzySearchSessionTest(TransactionTestCase):
+    def show_threshold(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW pg_trgm.word_similarity_threshold")
+            return cursor.fetchone()[0]
+
+    def test_fuzzy_threshold_does_not_outlive_request(self):
+        sample_book(title="The Hobbit", author="J. R. R. Tolkien")
+        default = self.show_threshold()
+
+        with self.settings(BOOK_FUZZY_SEARCH_THRESHOLD=0.3):
+            res = APIClient().get(BOOKS_URL, {"fuzzy": "tolkein"})
+
+        self.assertEqual(res.data["count"], 1)
+        self.assertEqual(self.show_threshold(), default)
+
+    def test_fuzzy_param_ignored_outside_list(self):
+        book = sample_book(title="The Hobbit", author="J. R. R. Tolkien")
+        client = APIClient()
+
+        listed = client.get(BOOKS_URL, {"fuzzy": "hobit"})
+        retrieved = client.get(detail_book_url(book.id), {"fuzzy": "hobit"})
+
+        self.assertEqual(listed.status_code, status.HTTP_200_OK)
+        self.assertEqual(listed.data["results"][0]["id"], book.id)
+        self.assertEqual(retrieved.status_code, status.HTTP_200_OK)
+        self.assertEqual(retrieved.data["id"], book.id)
@@ -0,0 +1,78 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from books.models import Book
+from books.serializers import BookReadSerializer
+
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class LineBuffer:
+    """File-like object whose ``write`` hands the line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def iter_book_rows(chunk_size: int):
+    """
+    Yield every book in the ``BookReadSerializer`` layout.
+
+    ``iterator()`` reads through a server-side cursor on PostgreSQL, so
+    only ``chunk_size`` rows are held in memory at a time.
+    """
+    serializer = BookReadSerializer()
+    fields = BookReadSerializer.Meta.fields
+    books = Book.objects.only(*fields).order_by("id")
+    for book in books.iterator(chunk_size=chunk_size):
+        yield serializer.to_representation(book)
+
+
+def render_csv(rows):
+    writer = csv.DictWriter(
+        LineBuffer(), fieldnames=BookReadSerializer.Meta.fields
+    )
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+RENDERERS = {
+    "csv": render_csv,
+    "ndjson": render_ndjson,
+}
+
+
+def stream_books(file_format: str, chunk_size: int = None):
+    """
+    Stream the whole catalog as CSV or NDJSON text.
+    Args:
+        file_format: Either "csv" or "ndjson"
+        chunk_size: Rows fetched per cursor round trip and emitted
+            per response chunk
+    Returns:
+        Generator of text chunks for ``StreamingHttpResponse``
+    """
+    chunk_size = chunk_size or settings.BOOK_EXPORT_CHUNK_SIZE
+    lines = RENDERERS[file_format](iter_book_rows(chunk_size))
+
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
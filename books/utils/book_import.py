@@ -0,0 +1,171 @@
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from books.models import Book
+from books.serializers import BookImportSerializer
+from books.utils.cache import invalidate_book_cache
+
+
+IMPORT_FORMATS = ("csv", "jsonl")
+UNSUPPORTED_FORMAT_MESSAGE = (
+    f"Unsupported file format. Use one of: {', '.join(IMPORT_FORMATS)}."
+)
+
+
+class BookImportError(Exception):
+    """Raised when an import file cannot be read at all"""
+    pass
+
+
+class BookFileError(BookImportError):
+    """Raised when the file is not UTF-8 text or not parseable CSV"""
+    pass
+
+
+def detect_format(filename: str) -> str:
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension == "ndjson":
+        return "jsonl"
+    if extension not in IMPORT_FORMATS:
+        raise BookImportError(UNSUPPORTED_FORMAT_MESSAGE)
+    return extension
+
+
+def read_csv_rows(lines):
+    yield from csv.DictReader(lines)
+
+
+def read_jsonl_rows(lines):
+    """Yield one dict per line; malformed lines are yielded as ``None``."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else None
+
+
+ROW_READERS = {
+    "csv": read_csv_rows,
+    "jsonl": read_jsonl_rows,
+}
+
+
+class BookImporter:
+    """
+    Stream rows into the catalog one chunk at a time.
+
+    Each chunk is validated with a single serializer instance, checked
+    for existing (title, author) pairs with one query and written with
+    ``bulk_create``, so memory and query count grow with the chunk size,
+    not with the file.
+    """
+
+    max_reported_errors = 100
+
+    def __init__(self, chunk_size: int = None):
+        self.chunk_size = chunk_size or settings.BOOK_IMPORT_CHUNK_SIZE
+        self.serializer = BookImportSerializer()
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+
+    def run(self, rows) -> dict:
+        numbered_rows = enumerate(rows, start=1)
+        while chunk := list(islice(numbered_rows, self.chunk_size)):
+            self.import_chunk(chunk)
+        return self.summary()
+
+    def import_chunk(self, chunk):
+        books = []
+        for row_number, row in chunk:
+            book = self.build_book(row_number, row)
+            if book is not None:
+                books.append(book)
+
+        with transaction.atomic():
+            books = self.drop_duplicates(books)
+            Book.objects.bulk_create(books, batch_size=self.chunk_size)
+            if books:
+                transaction.on_commit(invalidate_book_cache)
+        self.created += len(books)
+
+    def build_book(self, row_number, row):
+        if row is None:
+            self.add_error(row_number, "Row is not a valid JSON object.")
+            return None
+
+        try:
+            validated_data = self.serializer.run_validation(row)
+        except serializers.ValidationError as e:
+            self.add_error(row_number, e.detail)
+            return None
+        return Book(**validated_data)
+
+    def drop_duplicates(self, books):
+        existing = set(
+            Book.objects.filter(
+                title__in={book.title for book in books}
+            ).values_list("title", "author")
+        )
+
+        unique_books = []
+        for book in books:
+            key = (book.title, book.author)
+            if key in existing:
+                self.duplicates += 1
+                continue
+            existing.add(key)
+            unique_books.append(book)
+        return unique_books
+
+    def add_error(self, row_number, detail):
+        self.invalid += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append({"row": row_number, "errors": detail})
+
+    def summary(self) -> dict:
+        return {
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "errors": self.errors,
+        }
+
+
+def import_books(lines, file_format: str, chunk_size: int = None) -> dict:
+    """
+    Import books from an iterable of text lines.
+    Args:
+        lines: File object or any iterable of CSV/JSONL lines
+        file_format: Either "csv" or "jsonl"
+        chunk_size: Rows validated and inserted per transaction
+    Returns:
+        dict: Counts of created, duplicate and invalid rows and
+        the first validation errors
+    Raises:
+        BookImportError: If the format is not supported
+        BookFileError: If the file cannot be decoded or parsed; chunks
+            before the broken line are already imported
+    """
+    if file_format not in ROW_READERS:
+        raise BookImportError(UNSUPPORTED_FORMAT_MESSAGE)
+    rows = ROW_READERS[file_format](lines)
+    importer = BookImporter(chunk_size=chunk_size)
+    try:
+        return importer.run(rows)
+    except UnicodeDecodeError:
+        problem = "File is not UTF-8 encoded text"
+    except csv.Error as e:
+        problem = f"Malformed CSV ({e})"
+    raise BookFileError(
+        f"{problem}; {importer.created} books were imported before it."
+    )
@@ -0,0 +1,84 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from books.utils.conditional import (
+    not_modified_response,
+    set_validator_headers,
+)
+
+
+BOOK_CACHE_VERSION_KEY = "books:version"
+
+
+def get_book_cache_version() -> int:
+    version = cache.get(BOOK_CACHE_VERSION_KEY)
+    if version is None:
+        # Seed with a timestamp so an evicted version never points back
+        # at entries that were cached before the eviction.
+        cache.add(BOOK_CACHE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(BOOK_CACHE_VERSION_KEY)
+    return version
+
+
+def invalidate_book_cache():
+    """Make every cached book response stale by bumping the version."""
+    try:
+        cache.incr(BOOK_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(BOOK_CACHE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def book_cache_key(request) -> str:
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = request.build_absolute_uri(request.path)
+    digest = hashlib.md5(f"{url}?{query}".encode()).hexdigest()
+    return f"books:{get_book_cache_version()}:{digest}"
+
+
+def cache_book_response(view_method):
+    """
+    Serve successful book reads from the cache.
+
+    Entries are keyed by the absolute URL and sorted query params under
+    the current catalog version, so ``invalidate_book_cache`` drops all
+    of them at once. The ETag and Last-Modified of the cached response
+    are kept with it, so conditional requests are answered from the
+    cache too.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = book_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            etag = entry["etag"]
+            last_modified = entry["last_modified"]
+            not_modified = not_modified_response(
+                request, etag, last_modified
+            )
+            if not_modified is not None:
+                return not_modified
+            return set_validator_headers(
+                Response(entry["data"]), etag, last_modified
+            )
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            entry = {
+                "data": response.data,
+                "etag": response.get("ETag"),
+                "last_modified": parse_http_date_safe(
+                    response.get("Last-Modified")
+                ),
+            }
+            cache.set(key, entry, settings.BOOK_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
@@ -0,0 +1,30 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.md5("|".join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def set_validator_headers(response, etag, last_modified):
+    """``last_modified`` is a Unix timestamp or ``None``."""
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def not_modified_response(request, etag, last_modified):
+    """
+    Return a 304 response when ``If-None-Match`` / ``If-Modified-Since``
+    show the client already has this representation, otherwise ``None``.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        return None
+    return set_validator_headers(response, etag, last_modified)
@@ -0,0 +1,119 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+
+from books.models import SEARCH_CONFIG
+
+
+class BookFullTextSearchFilter(SearchFilter):
+    """
+    Route ``?search=`` to the indexed ``Book.search_vector`` column.
+
+    Every term is matched as a prefix (``tolk`` finds "Tolkien") and all
+    terms must match. Results are ordered by relevance, so the view has
+    to paginate them without relying on a fixed ordering. A search
+    without any word characters matches every book, ordered by id.
+    """
+
+    term_pattern = re.compile(r"\w+")
+
+    def get_search_query(self, request):
+        words = [
+            word
+            for term in self.get_search_terms(request)
+            for word in self.term_pattern.findall(term)
+        ]
+        if not words:
+            return None
+
+        return SearchQuery(
+            " & ".join(f"{word}:*" for word in words),
+            search_type="raw",
+            config=SEARCH_CONFIG,
+        )
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if query is None:
+            if request.query_params.get(self.search_param):
+                # Still paginated as a search, which needs a stable order
+                return queryset.order_by("id")
+            return queryset
+
+        return queryset.filter(
+            search_vector=query
+        ).annotate(
+            rank=SearchRank(F("search_vector"), query)
+        ).order_by("-rank", "id")
+
+
+class BookFuzzySearchFilter(BaseFilterBackend):
+    """
+    Typo-tolerant ``?fuzzy=`` lookup over title and author.
+
+    Matches are cut off at ``BOOK_FUZZY_SEARCH_THRESHOLD`` and ordered by
+    word similarity. The pg_trgm ``%>`` operator is kept as a prefilter so
+    the trigram GIN indexes can answer the query; its threshold is set
+    with ``SET LOCAL`` semantics, so the queryset has to be evaluated in
+    the same transaction (``BookViewSet.list`` opens one) and pooled
+    connections keep the server default. Only the ``list`` action is
+    filtered; detail routes ignore the parameter.
+    """
+
+    fuzzy_param = "fuzzy"
+
+    def set_threshold(self, queryset):
+        connection = connections[queryset.db]
+        if not connection.in_atomic_block:
+            raise ImproperlyConfigured(
+                "BookFuzzySearchFilter must run inside transaction.atomic()."
+            )
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config("
+                "'pg_trgm.word_similarity_threshold', %s, true)",
+                [str(settings.BOOK_FUZZY_SEARCH_THRESHOLD)],
+            )
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.fuzzy_param, "").strip()
+        if not term or getattr(view, "action", None) != "list":
+            return queryset
+
+        self.set_threshold(queryset)
+        return queryset.filter(
+            Q(title__trigram_word_similar=term)
+            | Q(author__trigram_word_similar=term)
+        ).annotate(
+            similarity=Greatest(
+                TrigramWordSimilarity(term, "title"),
+                TrigramWordSimilarity(term, "author"),
+            )
+        ).filter(
+            similarity__gte=settings.BOOK_FUZZY_SEARCH_THRESHOLD
+        ).order_by("-similarity", "id")
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.fuzzy_param,
+                "required": False,
+                "in": "query",
+                "description": (
+                    "Typo-tolerant match against title and author, "
+                    "ordered by similarity."
+                ),
+                "schema": {"type": "string"},
+            },
+        ]
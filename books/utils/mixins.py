@@ -1,4 +1,12 @@
+from django.utils.cache import patch_vary_headers
 from rest_framework import viewsets
+from rest_framework.response import Response
+
+from books.utils.conditional import (
+    make_etag,
+    not_modified_response,
+    set_validator_headers,
+)
 
 
 class ActionMixin(viewsets.ModelViewSet):
@@ -11,3 +19,109 @@ class ActionMixin(viewsets.ModelViewSet):
         ):
             return self.action_serializers[self.action]
         return super().get_serializer_class()
+
+
+def related_values(obj, path: str) -> list:
+    """
+    Values at a ``__`` separated path, following to-many relations.
+
+    Relations should be loaded with ``select_related`` or prefetched,
+    otherwise every step costs a query.
+    """
+    name, _, rest = path.partition("__")
+    value = getattr(obj, name, None)
+    if value is None:
+        return []
+    if hasattr(value, "all"):
+        return [
+            item_value
+            for item in value.all()
+            for item_value in related_values(item, rest)
+        ]
+    return related_values(value, rest) if rest else [value]
+
+
+class ConditionalGetMixin:
+    """
+    Answer ``list`` and ``retrieve`` with 304 Not Modified when the
+    client's copy is current.
+
+    Validators are computed from the objects being served: their ids
+    and every ``conditional_timestamp_fields`` value, read from the
+    already loaded relations. They cost no extra query and an unchanged
+    poll skips serialization. A list ETag also covers the pagination
+    envelope. Lists send no ``Last-Modified``, because a deleted row
+    would not move it.
+    """
+
+    conditional_timestamp_fields = ("updated_at",)
+    conditional_vary_on_user = False
+
+    def get_timestamps(self, obj) -> list:
+        return [
+            value
+            for field in self.conditional_timestamp_fields
+            for value in related_values(obj, field)
+        ]
+
+    def get_etag(self, objects, *extra) -> str:
+        fingerprint = [
+            (obj.pk, sorted(map(str, self.get_timestamps(obj))))
+            for obj in objects
+        ]
+        return make_etag(
+            self.request.get_full_path(),
+            self.request.user.pk if self.conditional_vary_on_user else "",
+            fingerprint,
+            *extra,
+        )
+
+    def set_conditional_headers(self, response, etag, last_modified=None):
+        set_validator_headers(response, etag, last_modified)
+        if self.conditional_vary_on_user:
+            patch_vary_headers(response, ("Authorization", "Cookie"))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            objects = list(queryset)
+            envelope = None
+        else:
+            objects = page
+            envelope = {
+                key: value
+                for key, value in self.get_paginated_response([]).data.items()
+                if key != "results"
+            }
+
+        etag = self.get_etag(objects, envelope)
+        not_modified = not_modified_response(request, etag, None)
+        if not_modified is not None:
+            return self.set_conditional_headers(not_modified, etag)
+
+        serializer = self.get_serializer(objects, many=True)
+        if page is None:
+            response = Response(serializer.data)
+        else:
+            response = self.get_paginated_response(serializer.data)
+        return self.set_conditional_headers(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        timestamps = self.get_timestamps(instance)
+        last_modified = (
+            int(max(timestamps).timestamp()) if timestamps else None
+        )
+        etag = self.get_etag([instance])
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return self.set_conditional_headers(
+                not_modified, etag, last_modified
+            )
+
+        serializer = self.get_serializer(instance)
+        return self.set_conditional_headers(
+            Response(serializer.data), etag, last_modified
+        )
@@ -0,0 +1,34 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class LibraryCursorPagination(CursorPagination):
+    """
+    Keyset pagination with opaque cursors.
+
+    Every page is fetched with ``WHERE <ordering> > <cursor> LIMIT n``,
+    so its cost does not depend on how deep the client has paged.
+    Subclasses must set an ``ordering`` backed by an index.
+    """
+
+    page_size = settings.PAGINATION_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+
+
+class BookCursorPagination(LibraryCursorPagination):
+    ordering = ("id",)
+
+
+class BookSearchPagination(PageNumberPagination):
+    """
+    Page-number pagination for relevance-ranked search results.
+
+    A cursor needs a unique, stable ordering, which a relevance score
+    cannot provide. Ranked queries are bounded by the index lookup
+    instead, so a page number is cheap enough here.
+    """
+
+    page_size = settings.PAGINATION_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
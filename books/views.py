@@ -1,5 +1,13 @@
+import io
+
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 
 from books.models import Book
 from books.permissions import IsAdminOrReadOnly
@@ -9,14 +17,30 @@ from books.schema_descriptions import (
     book_create_schema,
     book_update_schema,
     book_partial_update_schema,
-    book_destroy_schema
+    book_destroy_schema,
+    book_import_schema,
+    book_export_schema,
 )
 from books.serializers import BookReadSerializer, BookCreateSerializer
-from books.utils.mixins import ActionMixin
+from books.utils.book_export import EXPORT_FORMATS, stream_books
+from books.utils.book_import import (
+    BookFileError,
+    BookImportError,
+    detect_format,
+    import_books,
+)
+from books.utils.cache import cache_book_response
+from books.utils.filters import (
+    BookFullTextSearchFilter,
+    BookFuzzySearchFilter,
+)
+from books.utils.mixins import ActionMixin, ConditionalGetMixin
+from books.utils.pagination import BookCursorPagination, BookSearchPagination
 
 
-class BookViewSet(ActionMixin):
-    queryset = Book.objects.all()
+class BookViewSet(ConditionalGetMixin, ActionMixin):
+    queryset = Book.objects.defer("search_vector")
+    serializer_class = BookReadSerializer
     action_serializers = {
         "list": BookReadSerializer,
         "retrieve": BookReadSerializer,
@@ -25,16 +49,44 @@ class BookViewSet(ActionMixin):
         "partial_update": BookCreateSerializer,
     }
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = BookCursorPagination
+    search_pagination_class = BookSearchPagination
 
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [
+        DjangoFilterBackend,
+        BookFullTextSearchFilter,
+        BookFuzzySearchFilter,
+    ]
     filterset_fields = ["title", "author"]
-    search_fields = ["title"]
+    ranked_query_params = ["search", "fuzzy"]
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            ranked = any(
+                self.request.query_params.get(param)
+                for param in self.ranked_query_params
+            )
+            pagination_class = (
+                self.search_pagination_class
+                if ranked
+                else self.pagination_class
+            )
+            self._paginator = pagination_class()
+        return self._paginator
 
     @book_list_schema
+    @cache_book_response
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        if not request.query_params.get(BookFuzzySearchFilter.fuzzy_param):
+            return super().list(request, *args, **kwargs)
+
+        # The fuzzy threshold only lives as long as this transaction.
+        with transaction.atomic(using=self.get_queryset().db):
+            return super().list(request, *args, **kwargs)
 
     @book_retrieve_schema
+    @cache_book_response
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
@@ -53,3 +105,70 @@ class BookViewSet(ActionMixin):
     @book_destroy_schema
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser],
+    )
+    @book_import_schema
+    def import_books(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"file": "A CSV or JSONL file is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            file_format = (
+                request.data.get("file_format")
+                or detect_format(upload.name)
+            )
+            summary = import_books(
+                io.TextIOWrapper(
+                    upload.file, encoding="utf-8-sig", newline=""
+                ),
+                file_format=file_format,
+            )
+        except BookFileError as e:
+            return Response(
+                {"file": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except BookImportError as e:
+            return Response(
+                {"file_format": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(summary, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        permission_classes=[IsAdminUser],
+    )
+    @book_export_schema
+    def export_books(self, request):
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {
+                    "file_format":
+                        f"Use one of: {', '.join(EXPORT_FORMATS)}."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        response = StreamingHttpResponse(
+            stream_books(file_format),
+            content_type=EXPORT_FORMATS[file_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="books.{file_format}"'
+        )
+        return response
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+        ('borrowings', '0003_alter_borrowing_actual_return_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['borrow_date', 'id'], name='borrowing_borrow_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowings', '0004_borrowing_borrow_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowing',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
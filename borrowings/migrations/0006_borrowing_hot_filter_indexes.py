@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:39
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('books', '0004_book_updated_at'),
+        ('borrowings', '0005_borrowing_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='borrowing',
+            index=models.Index(fields=['user', 'borrow_date', 'id'], name='borrowing_user_borrow_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='borrowing',
+            index=models.Index(condition=models.Q(('actual_return_date__isnull', True)), fields=['expected_return_date'], name='borrowing_open_due_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='borrowing',
+            index=models.Index(condition=models.Q(('actual_return_date__isnull', True)), fields=['user'], name='borrowing_open_user_idx'),
+        ),
+    ]
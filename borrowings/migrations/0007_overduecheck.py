@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowings', '0006_borrowing_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueCheck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cutoff', models.DateTimeField()),
+                ('last_borrowing_id', models.BigIntegerField(default=0)),
+                ('reported', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowings', '0007_overduecheck'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='overduecheck',
+            name='since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
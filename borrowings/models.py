@@ -1,8 +1,11 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from books.inventory_service import release_book
+
 
 class Borrowing(models.Model):
     borrow_date = models.DateTimeField(
@@ -23,6 +26,31 @@ class Borrowing(models.Model):
         on_delete=models.CASCADE,
         related_name="borrowings"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["borrow_date", "id"],
+                name="borrowing_borrow_date_id_idx"
+            ),
+            models.Index(
+                fields=["user", "borrow_date", "id"],
+                name="borrowing_user_borrow_date_idx"
+            ),
+            models.Index(
+                fields=["expected_return_date"],
+                name="borrowing_open_due_idx",
+                condition=models.Q(actual_return_date__isnull=True)
+            ),
+            models.Index(
+                fields=["user"],
+                name="borrowing_open_user_idx",
+                condition=models.Q(actual_return_date__isnull=True)
+            ),
+        ]
 
     def clean(self):
         if self.borrow_date is not None:
@@ -43,6 +71,67 @@ class Borrowing(models.Model):
         self.clean()
         super().save(*args, **kwargs)
 
+    def mark_returned(self) -> bool:
+        """
+        Record the return and put the copy back into the inventory.
+
+        Both happen in one transaction and only if the borrowing is still
+        open, so a repeated or concurrent return is a no-op.
+        Returns:
+            bool: False if the book had already been returned
+        """
+        returned_at = timezone.now()
+        with transaction.atomic():
+            returned = Borrowing.objects.filter(
+                pk=self.pk,
+                actual_return_date__isnull=True
+            ).update(
+                actual_return_date=returned_at,
+                updated_at=returned_at
+            )
+            if not returned:
+                return False
+            release_book(self.book_id)
+
+        self.actual_return_date = returned_at
+        self.updated_at = returned_at
+        return True
+
     def __str__(self):
         return (f"{self.user.email} borrowed "
                 f"{self.book.title} on {self.borrow_date}")
+
+
+class OverdueCheck(models.Model):
+    """
+    Progress of one ``check_overdue_borrowings`` run.
+
+    A run reports borrowings that fell due in ``[since, cutoff)``, where
+    ``since`` is the cutoff of the previous completed run, so every
+    borrowing is announced once when it becomes overdue. Borrowings are
+    reported in id order and ``last_borrowing_id`` is advanced together
+    with every digest, so a failed run resumes after the last borrowing
+    it already reported.
+    """
+
+    since = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    cutoff = models.DateTimeField()
+    last_borrowing_id = models.BigIntegerField(
+        default=0
+    )
+    reported = models.PositiveIntegerField(
+        default=0
+    )
+    started_at = models.DateTimeField(
+        auto_now_add=True
+    )
+    completed_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    def __str__(self):
+        return f"Overdue check up to {self.cutoff}"
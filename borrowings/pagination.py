@@ -0,0 +1,5 @@
+from books.utils.pagination import LibraryCursorPagination
+
+
+class BorrowingCursorPagination(LibraryCursorPagination):
+    ordering = ("-borrow_date", "-id")
@@ -16,7 +16,12 @@ borrowing_list_schema = extend_schema(
         "- Regular users can only view their own borrowings\n\n"
         "Filtering:\n"
         "- Admins can filter by user_id\n"
-        "- All users can filter by is_active status"
+        "- All users can filter by is_active status\n\n"
+        "Pagination:\n"
+        "- Borrowings are ordered from newest to oldest\n"
+        "- Follow the **next** / **previous** links to move between pages\n"
+        "- **page_size** sets the number of borrowings per page "
+        "(limited by the server maximum)"
     ),
     parameters=[
         OpenApiParameter(
@@ -67,7 +72,10 @@ borrowing_create_schema = extend_schema(
         "- User cannot have any pending or expired payments\n"
         "- Book must be available in inventory\n"
         "- Expected return date must be in the future\n"
-        "- User must be authenticated"
+        "- User must be authenticated\n\n"
+        "With BORROWING_ASYNC_CHECKOUT enabled the Stripe session is "
+        "created in the background. The response then also contains "
+        "`payment_id` and `payment_status_url` to poll for the checkout URL."
     ),
     request=BorrowingCreateSerializer,
     responses={
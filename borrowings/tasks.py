@@ -1,27 +1,202 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import islice
+
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
 from django.utils import timezone
-from borrowings.models import Borrowing
-from telegram_bot.telegram import send_telegram_message
+from borrowings.models import Borrowing, OverdueCheck
+from outbox.service import (
+    build_telegram_message,
+    publish_many,
+    publish_telegram_message,
+)
+from telegram_bot.notifications import Notification, notify_users
+from telegram_bot.telegram import MESSAGE_LIMIT
+
+
+DIGEST_HEADER = "📚 <b>Overdue Borrowings</b>\n"
+REMINDER_HEADER = "⏰ <b>Please return your overdue books</b>\n"
+
+
+@dataclass
+class Digest:
+    text: str
+    last_borrowing_id: int
+    count: int
+
+
+def format_overdue(email, title, expected_return_date) -> str:
+    return (
+        f"\n👤 User: {email}\n"
+        f"📖 Book: {title}\n"
+        f"📅 Expected Return: "
+        f"{expected_return_date.strftime('%Y-%m-%d %H:%M')}\n"
+    )
+
+
+def build_digests(rows, limit: int = None):
+    """
+    Pack overdue rows into as few messages as fit Telegram's limit.
+    Args:
+        rows: Iterable of (id, email, title, expected_return_date)
+        limit: Maximum length of one message
+    Returns:
+        Generator of ``Digest`` objects
+    """
+    limit = limit or MESSAGE_LIMIT
+    entries = []
+    length = len(DIGEST_HEADER)
+    last_id = None
+
+    for borrowing_id, *fields in rows:
+        entry = format_overdue(*fields)
+        if entries and length + len(entry) > limit:
+            yield Digest(DIGEST_HEADER + "".join(entries), last_id,
+                         len(entries))
+            entries = []
+            length = len(DIGEST_HEADER)
+        entries.append(entry)
+        length += len(entry)
+        last_id = borrowing_id
+
+    if entries:
+        yield Digest(DIGEST_HEADER + "".join(entries), last_id, len(entries))
+
+
+def build_reminders(check: OverdueCheck, rows) -> list:
+    """
+    Build one reminder per borrower for a chunk of overdue rows.
+    Args:
+        check: Check the rows belong to
+        rows: List of (id, email, title, expected_return_date, user_id)
+    """
+    books = defaultdict(list)
+    for _, _, title, expected_return_date, user_id in rows:
+        books[user_id].append(
+            f"\n📖 {title}\n📅 Expected Return: "
+            f"{expected_return_date.strftime('%Y-%m-%d %H:%M')}\n"
+        )
+
+    last_id = rows[-1][0]
+    return [
+        Notification(
+            user_id,
+            REMINDER_HEADER + "".join(entries),
+            f"overdue-{check.id}-{last_id}-user-{user_id}",
+        )
+        for user_id, entries in books.items()
+    ]
+
+
+def report_overdue(check: OverdueCheck) -> None:
+    """
+    Queue digests and reminders for every borrowing that became overdue
+    between ``check.since`` and ``check.cutoff`` and is not reported yet.
+
+    Rows are read in chunks. Each chunk's staff digests, borrower
+    reminders and checkpoint are written in one transaction, with the
+    borrowers' chats resolved in one query.
+    """
+    overdue = Borrowing.objects.filter(
+        expected_return_date__lt=check.cutoff,
+        actual_return_date__isnull=True,
+        id__gt=check.last_borrowing_id
+    )
+    if check.since is not None:
+        overdue = overdue.filter(expected_return_date__gte=check.since)
+    overdue = overdue.order_by("id").values_list(
+        "id", "user__email", "book__title", "expected_return_date",
+        "user_id"
+    )
+
+    chunk_size = settings.OVERDUE_CHECK_CHUNK_SIZE
+    rows = overdue.iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        digests = build_digests(row[:4] for row in chunk)
+        with transaction.atomic():
+            publish_many([
+                build_telegram_message(
+                    digest.text,
+                    dedupe_key=(
+                        f"overdue-{check.id}-{digest.last_borrowing_id}"
+                    ),
+                )
+                for digest in digests
+            ])
+            notify_users(build_reminders(check, chunk))
+            OverdueCheck.objects.filter(pk=check.pk).update(
+                last_borrowing_id=chunk[-1][0],
+                reported=F("reported") + len(chunk)
+            )
+
+    check.refresh_from_db()
+    with transaction.atomic():
+        if not check.reported:
+            publish_telegram_message(
+                "No new overdue borrowings today!",
+                dedupe_key=f"overdue-{check.id}-none",
+            )
+        check.completed_at = timezone.now()
+        check.save(update_fields=["completed_at"])
 
 
 @shared_task
 def check_overdue_borrowings():
+    """
+    Report borrowings that became overdue since the previous run to
+    the staff chat in digest messages and remind each borrower in
+    their own chat.
+
+    An unfinished check left by a failed run is resumed with its
+    original window before a new one is started.
+    """
+    check = OverdueCheck.objects.filter(
+        completed_at__isnull=True
+    ).order_by("id").first()
+    if check is None:
+        previous = OverdueCheck.objects.filter(
+            completed_at__isnull=False
+        ).order_by("-cutoff").first()
+        check = OverdueCheck.objects.create(
+            since=previous.cutoff if previous else None,
+            cutoff=timezone.now()
+        )
+    report_overdue(check)
+
+
+@shared_task
+def summarize_overdue_borrowings():
+    """
+    Post the totals of open and overdue borrowings.
+
+    A single aggregate over the open borrowings, answered from the
+    partial indexes, so its cost does not depend on the size of the
+    overdue backlog.
+    """
     now = timezone.now()
-    overdue = Borrowing.objects.filter(
-        expected_return_date__lt=now,
+    is_overdue = Q(expected_return_date__lt=now)
+    totals = Borrowing.objects.filter(
         actual_return_date__isnull=True
-    ).select_related("user", "book")
-
-    if not overdue.exists():
-        send_telegram_message("No borrowings overdue today!")
-        return
-
-    for obj in overdue:
-        message = (
-            f"📚 <b>Overdue Borrowing</b>\n"
-            f"👤 User: {obj.user.email}\n"
-            f"📖 Book: {obj.book.title}\n"
-            f"📅 Expected Return: "
-            f"{obj.expected_return_date.strftime('%Y-%m-%d %H:%M')}"
+    ).aggregate(
+        active=Count("id"),
+        overdue=Count("id", filter=is_overdue),
+        oldest_due=Min("expected_return_date", filter=is_overdue),
+    )
+
+    message = (
+        f"📊 <b>Borrowings Summary</b>\n"
+        f"📖 Active: {totals['active']}\n"
+        f"⏰ Overdue: {totals['overdue']}"
+    )
+    if totals["oldest_due"]:
+        message += (
+            f"\n📅 Oldest Due: "
+            f"{totals['oldest_due'].strftime('%Y-%m-%d %H:%M')}"
         )
-        send_telegram_message(message)
+    publish_telegram_message(
+        message,
+        dedupe_key=f"overdue-summary-{now.date().isoformat()}",
+    )
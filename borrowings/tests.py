@@ -1,10 +1,16 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.utils.timezone import now
-from borrowings.models import Borrowing
+from borrowings.models import Borrowing, OverdueCheck
+from borrowings.tasks import (
+    build_digests,
+    check_overdue_borrowings,
+    summarize_overdue_borrowings
+)
 from books.models import Book
 from django.contrib.auth import get_user_model
 from borrowings.serializers import (
@@ -13,6 +19,10 @@ from borrowings.serializers import (
 )
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils import translation
+from decimal import Decimal
+from payment_service.models import Payment
+from outbox.models import OutboxMessage
+from library_service.testing import IndexPlanTestCase
 
 User = get_user_model()
 
@@ -104,6 +114,9 @@ class BorrowingSerializerTest(TestCase):
 
 
 class BorrowingViewSetTest(TestCase):
+    list_query_budget = 3
+    detail_query_budget = 3
+
     def setUp(self):
         self.client = APIClient()
         self.user = User.objects.create_user(
@@ -136,15 +149,165 @@ class BorrowingViewSetTest(TestCase):
     def test_borrowing_list(self):
         response = self.client.get("/api/borrowings/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIsInstance(response.data, list)
-        self.assertGreaterEqual(len(response.data), 1)
-        borrowing_data = response.data[0]
+        self.assertIsInstance(response.data["results"], list)
+        self.assertGreaterEqual(len(response.data["results"]), 1)
+        borrowing_data = response.data["results"][0]
         self.assertIn("id", borrowing_data)
         self.assertIn("borrow_date", borrowing_data)
         self.assertIn("expected_return_date", borrowing_data)
         self.assertIn("actual_return_date", borrowing_data)
         self.assertIn("book", borrowing_data)
 
+    def test_borrowing_list_newest_first_pages(self):
+        newer = Borrowing.objects.create(
+            expected_return_date=timezone.now() + timezone.timedelta(days=5),
+            book=self.book,
+            user=self.user
+        )
+        response = self.client.get("/api/borrowings/", {"page_size": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["id"], newer.id)
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            response.data["results"][0]["id"], self.borrowing.id
+        )
+        self.assertIsNone(response.data["next"])
+
+    def test_borrowing_list_not_modified_until_payment_changes(self):
+        response = self.client.get("/api/borrowings/")
+        etag = response["ETag"]
+
+        response = self.client.get(
+            "/api/borrowings/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Payment.objects.create(
+            borrowing=self.borrowing,
+            session_id="test_session_id",
+            session_url="https://test.com/session",
+            money_to_pay=Decimal("7.50")
+        )
+        response = self.client.get(
+            "/api/borrowings/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"][0]["payments"]), 1)
+
+    def test_borrowing_list_etag_changes_when_payment_deleted(self):
+        payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            session_id="test_session_id",
+            session_url="https://test.com/session",
+            money_to_pay=Decimal("7.50")
+        )
+        response = self.client.get("/api/borrowings/")
+        etag = response["ETag"]
+        self.assertFalse(response.has_header("Last-Modified"))
+        self.assertIn("Authorization", response["Vary"])
+
+        payment.delete()
+        response = self.client.get(
+            "/api/borrowings/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["payments"], [])
+
+    def test_borrowing_detail_not_modified(self):
+        url = f"/api/borrowings/{self.borrowing.id}/"
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn("Authorization", response["Vary"])
+
+        self.borrowing.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_borrowing_return_twice_releases_one_copy(self):
+        Payment.objects.create(
+            borrowing=self.borrowing,
+            session_id="test_session_id",
+            session_url="https://test.com/session",
+            money_to_pay=Decimal("7.50"),
+            status=Payment.Status.PAID
+        )
+        url = f"/api/borrowings/{self.borrowing.id}/return/"
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 11)
+        self.assertFalse(self.borrowing.mark_returned())
+
+    @override_settings(BORROWING_ASYNC_CHECKOUT=True)
+    def test_borrowing_create_async_checkout(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post("/api/borrowings/", {
+            "book": self.book.id,
+            "expected_return_date": (
+                timezone.now() + timezone.timedelta(days=3)
+            ).isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        payment = Payment.objects.get(id=response.data["payment_id"])
+        self.assertEqual(payment.status, Payment.Status.PENDING)
+        self.assertEqual(payment.session_url, "")
+        self.assertTrue(
+            response.data["payment_status_url"].endswith(
+                f"/api/payments/{payment.id}/checkout/"
+            )
+        )
+        self.assertEqual(
+            set(OutboxMessage.objects.values_list("dedupe_key", flat=True)),
+            {
+                f"borrowing-{response.data['id']}-created",
+                f"payment-{payment.id}-checkout",
+            }
+        )
+
+    def add_borrowings_with_payments(self, count):
+        for _ in range(count):
+            borrowing = Borrowing.objects.create(
+                expected_return_date=(
+                    timezone.now() + timezone.timedelta(days=5)
+                ),
+                book=self.book,
+                user=self.user
+            )
+            for attempt in ("first", "second"):
+                Payment.objects.create(
+                    borrowing=borrowing,
+                    session_id=f"{attempt}_session_{borrowing.id}",
+                    session_url="https://test.com/session",
+                    money_to_pay=Decimal("7.50")
+                )
+
+    def test_borrowing_list_query_budget(self):
+        # Authentication, page, prefetched payments; the ETag is built
+        # from the loaded page
+        with self.assertNumQueries(self.list_query_budget):
+            self.client.get("/api/borrowings/")
+
+        self.add_borrowings_with_payments(10)
+        with self.assertNumQueries(self.list_query_budget):
+            response = self.client.get("/api/borrowings/")
+        self.assertEqual(len(response.data["results"]), 11)
+        self.assertEqual(len(response.data["results"][0]["payments"]), 2)
+
+    def test_borrowing_detail_query_budget(self):
+        self.add_borrowings_with_payments(1)
+        borrowing = Borrowing.objects.latest("id")
+        with self.assertNumQueries(self.detail_query_budget):
+            response = self.client.get(f"/api/borrowings/{borrowing.id}/")
+        self.assertEqual(len(response.data["payments"]), 2)
+
     def test_borrowing_detail(self):
         response = self.client.get(f"/api/borrowings/{self.borrowing.id}/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -222,3 +385,180 @@ class BorrowingCreateSerializerTestCase(TestCase):
             serializer.errors["book"][0],
             "Sorry, the book is currently unavailable for borrowing"
         )
+
+
+class BorrowingIndexPlanTest(IndexPlanTestCase):
+    """
+    Seed a table large enough for the planner to prefer an index and
+    check the hot borrowing filters never fall back to a sequential scan.
+    """
+
+    rows = 100_000
+    users = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            inventory=10,
+            daily_fee=1.5,
+            cover="HARD"
+        )
+        User.objects.bulk_create(
+            User(email=f"reader{i}@test.com") for i in range(cls.users)
+        )
+        cls.user = User.objects.order_by("id").first()
+        cls.seed_rows(Borrowing, cls.rows, {
+            "borrow_date": "now() - i * interval '1 minute'",
+            "expected_return_date": (
+                "now() - i * interval '1 minute' + interval '7 days'"
+            ),
+            "actual_return_date": (
+                "CASE WHEN i %% 50 = 0 THEN NULL ELSE now() END"
+            ),
+            "book_id": "%s",
+            "user_id": "%s + i %% %s",
+            "updated_at": "now()",
+        }, [cls.book.id, cls.user.id, cls.users])
+
+    def test_overdue_filter_uses_partial_index(self):
+        self.assertUsesIndex(
+            Borrowing.objects.filter(
+                expected_return_date__lt=timezone.now(),
+                actual_return_date__isnull=True
+            ),
+            "borrowing_open_due_idx"
+        )
+
+    def test_active_user_filter_uses_partial_index(self):
+        self.assertUsesIndex(
+            Borrowing.objects.filter(
+                user_id=self.user.id,
+                actual_return_date__isnull=True
+            ),
+            "borrowing_open_user_idx"
+        )
+
+    def test_user_history_page_uses_composite_index(self):
+        self.assertUsesIndex(
+            Borrowing.objects.filter(
+                user_id=self.user.id
+            ).order_by("-borrow_date", "-id")[:20],
+            "borrowing_user_borrow_date_idx"
+        )
+
+
+class OverdueDigestTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            first_name="Test",
+            last_name="User",
+            email="user@test.com",
+            password="password"
+        )
+        self.borrowings = []
+        for title in ("First Book", "Second Book", "Third Book"):
+            book = Book.objects.create(
+                title=title,
+                author="Author",
+                inventory=10,
+                daily_fee=1.5,
+                cover="HARD"
+            )
+            self.borrowings.append(Borrowing.objects.create(
+                expected_return_date=(
+                    timezone.now() + timezone.timedelta(days=5)
+                ),
+                book=book,
+                user=self.user
+            ))
+        Borrowing.objects.update(
+            expected_return_date=timezone.now() - timezone.timedelta(days=1)
+        )
+
+    def test_overdue_borrowings_sent_as_one_digest(self):
+        check_overdue_borrowings()
+
+        message = OutboxMessage.objects.get()
+        for title in ("First Book", "Second Book", "Third Book"):
+            self.assertIn(title, message.payload["text"])
+        check = OverdueCheck.objects.get()
+        self.assertEqual(check.reported, 3)
+        self.assertIsNotNone(check.completed_at)
+
+    def test_digests_stay_within_limit(self):
+        rows = [
+            (i, "user@test.com", f"Book {i}", timezone.now())
+            for i in range(1, 51)
+        ]
+        digests = list(build_digests(rows, limit=500))
+
+        self.assertGreater(len(digests), 1)
+        self.assertTrue(all(len(d.text) <= 500 for d in digests))
+        self.assertEqual(sum(d.count for d in digests), 50)
+        self.assertEqual(digests[-1].last_borrowing_id, 50)
+
+    def test_unfinished_check_resumes_after_checkpoint(self):
+        OverdueCheck.objects.create(
+            cutoff=timezone.now(),
+            last_borrowing_id=self.borrowings[0].id,
+            reported=1
+        )
+        check_overdue_borrowings()
+
+        text = OutboxMessage.objects.get().payload["text"]
+        self.assertNotIn("First Book", text)
+        self.assertIn("Third Book", text)
+        check = OverdueCheck.objects.get()
+        self.assertEqual(check.reported, 3)
+        self.assertIsNotNone(check.completed_at)
+
+    def test_no_overdue_borrowings(self):
+        Borrowing.objects.update(actual_return_date=timezone.now())
+        check_overdue_borrowings()
+
+        self.assertEqual(
+            OutboxMessage.objects.get().payload["text"],
+            "No new overdue borrowings today!"
+        )
+
+    def test_next_run_reports_only_newly_overdue(self):
+        check_overdue_borrowings()
+        Borrowing.objects.filter(pk=self.borrowings[2].pk).update(
+            expected_return_date=timezone.now()
+        )
+        OutboxMessage.objects.all().delete()
+
+        check_overdue_borrowings()
+
+        latest = OverdueCheck.objects.latest("id")
+        self.assertEqual(
+            latest.since, OverdueCheck.objects.earliest("id").cutoff
+        )
+        self.assertEqual(latest.reported, 1)
+        text = OutboxMessage.objects.get().payload["text"]
+        self.assertIn("Third Book", text)
+        self.assertNotIn("First Book", text)
+
+    def test_linked_borrower_gets_one_reminder(self):
+        User.objects.filter(pk=self.user.pk).update(telegram_id=555)
+
+        check_overdue_borrowings()
+
+        reminder = OutboxMessage.objects.get(payload__chat_id=555)
+        for title in ("First Book", "Second Book", "Third Book"):
+            self.assertIn(title, reminder.payload["text"])
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+    def test_summary_reports_totals(self):
+        Borrowing.objects.filter(pk=self.borrowings[0].pk).update(
+            expected_return_date=timezone.now() + timezone.timedelta(days=1)
+        )
+        # One aggregate and the outbox insert
+        with self.assertNumQueries(2):
+            summarize_overdue_borrowings()
+
+        text = OutboxMessage.objects.get().payload["text"]
+        self.assertIn("Active: 3", text)
+        self.assertIn("Overdue: 2", text)
@@ -1,12 +1,18 @@
-from rest_framework import viewsets
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.urls import reverse
+from rest_framework import serializers, viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
-from datetime import datetime, timezone
 
 
+from books.inventory_service import BookUnavailableError, reserve_book
+from books.utils.mixins import ConditionalGetMixin
 from borrowings.models import Borrowing
+from borrowings.pagination import BorrowingCursorPagination
 from borrowings.serializers import (
     BorrowingReadSerializer,
     BorrowingCreateSerializer
@@ -21,15 +27,29 @@ from borrowings.schema_descriptions import (
     borrowing_return_schema,
 )
 from borrowings.permissions import IsOwnerOrAdmin
-from payment_service.stripe_service import create_stripe_checkout_session
+from payment_service.stripe_service import (
+    build_payment_urls,
+    create_pending_payment,
+    create_stripe_checkout_session
+)
 from payment_service.models import Payment
-from telegram_bot.telegram import send_telegram_message
+from payment_service.serializers import PaymentSerializer
+from outbox.models import OutboxMessage
+from outbox.service import build_telegram_message, publish, publish_many
 from payment_service.permissions import IsAdminOrReadOnly
+from telegram_bot.notifications import build_user_message, user_dedupe_key
 
 
-class BorrowingViewSet(viewsets.ModelViewSet):
+class BorrowingViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Borrowing.objects.all()
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin, IsAdminOrReadOnly]
+    pagination_class = BorrowingCursorPagination
+    conditional_timestamp_fields = (
+        "updated_at",
+        "book__updated_at",
+        "payments__updated_at",
+    )
+    conditional_vary_on_user = True
 
     @borrowing_list_schema
     def list(self, request, *args, **kwargs):
@@ -55,7 +75,12 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         return BorrowingReadSerializer
 
     def get_queryset(self):
-        queryset = Borrowing.objects.select_related("book", "user")
+        queryset = Borrowing.objects.select_related(
+            "book", "user"
+        ).defer("book__search_vector")
+        if self.action in ("list", "retrieve"):
+            queryset = queryset.prefetch_related(self.get_payments_prefetch())
+
         user = self.request.user
         user_id = self.request.query_params.get("user_id")
         is_active = self.request.query_params.get("is_active")
@@ -74,6 +99,20 @@ class BorrowingViewSet(viewsets.ModelViewSet):
             user=user
         )
 
+    @staticmethod
+    def get_payments_prefetch():
+        """
+        Load the nested payments of a whole page with one query,
+        reading only the columns ``PaymentSerializer`` renders and the
+        ``updated_at`` the ETag is built from.
+        """
+        return Prefetch(
+            "payments",
+            queryset=Payment.objects.only(
+                *PaymentSerializer.Meta.fields, "updated_at"
+            ).order_by("id"),
+        )
+
     @borrowing_create_schema
     def create(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
@@ -96,7 +135,15 @@ class BorrowingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        return super().create(request, *args, **kwargs)
+        response = super().create(request, *args, **kwargs)
+
+        payment = getattr(self, "pending_payment", None)
+        if payment is not None:
+            response.data["payment_id"] = payment.id
+            response.data["payment_status_url"] = request.build_absolute_uri(
+                reverse("payment-checkout", kwargs={"pk": payment.id})
+            )
+        return response
 
     @borrowing_update_schema
     def update(self, request, *args, **kwargs):
@@ -111,20 +158,26 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        borrowing = serializer.save(user=self.request.user)
+        with transaction.atomic():
+            try:
+                reserve_book(serializer.validated_data["book"].id)
+            except BookUnavailableError as e:
+                raise serializers.ValidationError({"book": str(e)})
+            borrowing = serializer.save(user=self.request.user)
 
-        book = borrowing.book
-        book.inventory -= 1
-        book.save()
+            days_rented = (
+                borrowing.expected_return_date - borrowing.borrow_date
+            ).days
 
-        days_rented = (
-            borrowing.expected_return_date - borrowing.borrow_date
-        ).days
+            if days_rented <= 0:
+                days_rented = 1
 
-        if days_rented <= 0:
-            days_rented = 1
+            amount = borrowing.book.daily_fee * days_rented
+            self.publish_created_messages(borrowing, amount)
 
-        amount = borrowing.book.daily_fee * days_rented
+            if settings.BORROWING_ASYNC_CHECKOUT:
+                self.schedule_checkout(borrowing, amount)
+                return
 
         create_stripe_checkout_session(
             borrowing=borrowing,
@@ -133,7 +186,44 @@ class BorrowingViewSet(viewsets.ModelViewSet):
             request=self.request
         )
 
-        message = (
+    def publish_created_messages(self, borrowing, amount):
+        """Notify the staff chat and the borrower's own chat"""
+        text = self.get_created_message(borrowing, amount)
+        dedupe_key = f"borrowing-{borrowing.id}-created"
+        messages = [build_telegram_message(text, dedupe_key)]
+        user_message = build_user_message(
+            borrowing.user, text, user_dedupe_key(dedupe_key)
+        )
+        if user_message is not None:
+            messages.append(user_message)
+        publish_many(messages)
+
+    def schedule_checkout(self, borrowing, amount):
+        """
+        Commit a placeholder payment with the borrowing and leave the
+        Stripe call to Celery through the outbox.
+        """
+        payment = create_pending_payment(
+            borrowing=borrowing,
+            amount=amount,
+            payment_type=Payment.Type.PAYMENT
+        )
+        success_url, cancel_url = build_payment_urls(payment, self.request)
+
+        publish(
+            OutboxMessage.Topic.STRIPE_CHECKOUT,
+            {
+                "payment_id": payment.id,
+                "success_url": success_url,
+                "cancel_url": cancel_url,
+            },
+            dedupe_key=f"payment-{payment.id}-checkout",
+        )
+        self.pending_payment = payment
+
+    @staticmethod
+    def get_created_message(borrowing, amount):
+        return (
             f"📚 <b>New Borrowing Created</b>\n"
             f"👤 User: {borrowing.user.email}\n"
             f"📖 Book: {borrowing.book.title}\n"
@@ -143,7 +233,6 @@ class BorrowingViewSet(viewsets.ModelViewSet):
             f"{borrowing.expected_return_date.strftime('%Y-%m-%d %H:%M')}\n"
             f"💰 Amount: ${amount:.2f}"
         )
-        send_telegram_message(message)
 
     @action(
         detail=True,
@@ -154,12 +243,13 @@ class BorrowingViewSet(viewsets.ModelViewSet):
     @borrowing_return_schema
     def return_book(self, request, pk=None):
         borrowing = self.get_object()
+        already_returned = Response(
+            {"detail": "This book has already been returned."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
         if borrowing.actual_return_date:
-            return Response(
-                {"detail": "This book has already been returned."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+            return already_returned
 
         payment = Payment.objects.filter(
             borrowing=borrowing,
@@ -177,12 +267,8 @@ class BorrowingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        borrowing.actual_return_date = datetime.now(timezone.utc)
-        borrowing.save()
-
-        book = borrowing.book
-        book.inventory += 1
-        book.save()
+        if not borrowing.mark_returned():
+            return already_returned
 
         if borrowing.actual_return_date > borrowing.expected_return_date:
             days_overdue = (
@@ -13,4 +13,28 @@ app.conf.beat_schedule = {
         "task": "borrowings.tasks.check_overdue_borrowings",
         "schedule": crontab(hour=0, minute=0),
     },
+    "summarize-overdue-borrowings": {
+        "task": "borrowings.tasks.summarize_overdue_borrowings",
+        "schedule": crontab(hour=9, minute=0),
+    },
+    "check-expired-sessions": {
+        "task": "payment_service.tasks.check_expired_sessions",
+        "schedule": 60.0,
+    },
+    "process-pending-stripe-events": {
+        "task": "payment_service.tasks.process_pending_stripe_events",
+        "schedule": crontab(minute="*/5"),
+    },
+    "relay-outbox": {
+        "task": "outbox.tasks.relay_outbox",
+        "schedule": 5.0,
+    },
+    "retry-dead-letters": {
+        "task": "telegram_bot.tasks.retry_dead_letters",
+        "schedule": 60.0,
+    },
+    "purge-outbox": {
+        "task": "outbox.tasks.purge_outbox",
+        "schedule": crontab(hour=3, minute=0),
+    },
 }
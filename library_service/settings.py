@@ -21,6 +21,7 @@ load_dotenv()
 
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 FINE_MULTIPLIER = 2
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,6 +51,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.sessions",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Our apps
     "django_filters",
     "django_celery_beat",
@@ -60,6 +62,7 @@ INSTALLED_APPS = [
     "user",
     "borrowings",
     "telegram_bot",
+    "outbox",
 ]
 
 MIDDLEWARE = [
@@ -156,6 +159,13 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+BOOK_FUZZY_SEARCH_THRESHOLD = 0.4
+BOOK_IMPORT_CHUNK_SIZE = 5000
+BOOK_EXPORT_CHUNK_SIZE = 2000
+
+PAGINATION_PAGE_SIZE = 20
+PAGINATION_MAX_PAGE_SIZE = 100
+
 REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_CLASSES": [
         "rest_framework.throttling.AnonRateThrottle",
@@ -196,9 +206,74 @@ SPECTACULAR_SETTINGS = {
     },
 }
 
-CELERY_BROKER_URL = (os.environ.get("CELERY_BROKER_URL"),)
-CELERY_RESULT_BACKEND = (os.environ.get("CELERY_RESULT_BACKEND"),)
+REDIS_HOST = os.getenv("REDIS_HOST")
+REDIS_PORT = os.getenv("REDIS_PORT", "6379")
+
+if REDIS_HOST:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/1",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+BOOK_CACHE_TIMEOUT = 5 * 60
+
+OVERDUE_CHECK_CHUNK_SIZE = 500
+
+PAYMENT_EXPIRY_BATCH_SIZE = 1000
+# Time left for a late Stripe completion webhook before expiring
+PAYMENT_EXPIRY_GRACE = timedelta(minutes=5)
+STRIPE_RECONCILE_SHARD_SIZE = 500
+STRIPE_RECONCILE_WORKERS = 8
+# Unprocessed webhook events older than this are enqueued again
+STRIPE_EVENT_RETRY_AFTER = timedelta(minutes=1)
+# Events of a session without a payment row are dropped after this
+STRIPE_EVENT_ORPHAN_AFTER = timedelta(days=1)
+# Seconds a checkout session status is reused by the success page
+STRIPE_SESSION_CACHE_TIMEOUT = 5
+STRIPE_SESSION_LOCK_TIMEOUT = 10
+
+# Seconds a getUpdates long poll is held open by Telegram
+TELEGRAM_POLL_TIMEOUT = 50
+TELEGRAM_POLLING_WORKERS = 8
+# Sent by Telegram in X-Telegram-Bot-Api-Secret-Token to the webhook
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+# Celery rate limit of the send task, per worker node
+TELEGRAM_TASK_RATE_LIMIT = "30/s"
+# Users resolved per query when fanning out direct notifications
+NOTIFICATION_BATCH_SIZE = 1000
+# Seconds a linked telegram_id answers /start without a database query
+TELEGRAM_LINK_CACHE_TIMEOUT = 60 * 60
+
+DEAD_LETTER_BATCH_SIZE = 100
+DEAD_LETTER_MAX_ATTEMPTS = 12
+# First dead-letter retry waits the base, every next one twice as long
+DEAD_LETTER_RETRY_BASE = timedelta(minutes=1)
+DEAD_LETTER_RETRY_MAX = timedelta(hours=6)
+# How long a claimed letter is hidden from other retry runs
+DEAD_LETTER_LEASE = timedelta(minutes=5)
+
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL")
+CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND")
 
 CELERY_TIMEZONE = "Europe/Kyiv"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+
+# Open the Stripe session and send the Telegram notification for a new
+# borrowing from Celery after commit instead of inside the request.
+BORROWING_ASYNC_CHECKOUT = (
+    os.getenv("BORROWING_ASYNC_CHECKOUT", "False") == "True"
+)
+
+OUTBOX_RELAY_BATCH_SIZE = 100
+OUTBOX_RETENTION_DAYS = 7
+# How long a delivered outbox message is remembered by its consumer
+OUTBOX_DEDUPE_TIMEOUT = 24 * 60 * 60
@@ -0,0 +1,36 @@
+from django.db import connection
+from django.test import TestCase
+
+
+class IndexPlanTestCase(TestCase):
+    """
+    Base for tests checking that hot filters are answered by an index.
+
+    The planner only prefers an index on a table large enough, so
+    ``seed_rows`` fills one with a single ``generate_series`` INSERT and
+    refreshes its statistics.
+    """
+
+    @classmethod
+    def seed_rows(cls, model, rows, columns, params=()):
+        """
+        Insert ``rows`` rows into the table of ``model`` and ANALYZE it.
+
+        ``columns`` maps column names to SQL expressions over the series
+        value ``i``. Their ``%s`` placeholders are filled from ``params``,
+        so a literal ``%`` has to be written as ``%%``.
+        """
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"SELECT {', '.join(columns.values())} "
+                "FROM generate_series(1, %s) AS i",
+                [*params, rows],
+            )
+            cursor.execute(f"ANALYZE {table}")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn("Seq Scan", plan)
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from outbox.models import OutboxMessage
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("id", "topic", "dedupe_key", "created_at", "dispatched_at")
+    list_filter = ("topic",)
+    search_fields = ("dedupe_key",)
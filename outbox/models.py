@@ -0,0 +1,42 @@
+from django.db import models
+
+
+class OutboxMessage(models.Model):
+    """
+    Side effect recorded in the same transaction as the change
+    that caused it and handed to Celery later by ``relay_outbox``.
+    """
+
+    class Topic(models.TextChoices):
+        TELEGRAM_MESSAGE = "telegram.message", "Telegram message"
+        STRIPE_CHECKOUT = "stripe.checkout", "Stripe checkout"
+
+    topic = models.CharField(
+        max_length=50,
+        choices=Topic.choices
+    )
+    payload = models.JSONField()
+    dedupe_key = models.CharField(
+        max_length=255,
+        unique=True
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+    dispatched_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        ordering = ("id",)
+        indexes = [
+            models.Index(
+                fields=["id"],
+                name="outbox_pending_idx",
+                condition=models.Q(dispatched_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.dedupe_key}"
@@ -0,0 +1,60 @@
+from outbox.models import OutboxMessage
+
+
+TOPIC_TASKS = {
+    OutboxMessage.Topic.TELEGRAM_MESSAGE:
+        "telegram_bot.tasks.send_telegram_message_task",
+    OutboxMessage.Topic.STRIPE_CHECKOUT:
+        "payment_service.tasks.create_checkout_session",
+}
+
+
+def build_message(topic: str, payload: dict, dedupe_key: str):
+    """
+    Build an unsaved outbox message.
+    Raises:
+        ValueError: If the topic has no task registered
+    """
+    if topic not in TOPIC_TASKS:
+        raise ValueError(f"Unknown outbox topic: {topic}")
+    return OutboxMessage(topic=topic, payload=payload, dedupe_key=dedupe_key)
+
+
+def build_telegram_message(text: str, dedupe_key: str, chat_id: str = None):
+    return build_message(
+        OutboxMessage.Topic.TELEGRAM_MESSAGE,
+        {"text": text, "chat_id": chat_id, "dedupe_key": dedupe_key},
+        dedupe_key,
+    )
+
+
+def publish_many(messages) -> None:
+    """
+    Store outbox messages with a single INSERT.
+
+    Call it inside the transaction that makes the domain change, so the
+    messages are only relayed if that change commits. Messages whose
+    ``dedupe_key`` is already stored are skipped, which makes publishing
+    the same event twice harmless.
+    """
+    OutboxMessage.objects.bulk_create(messages, ignore_conflicts=True)
+
+
+def publish(topic: str, payload: dict, dedupe_key: str) -> None:
+    """
+    Record a side effect to be run by Celery.
+    Args:
+        topic: One of ``OutboxMessage.Topic``
+        payload: JSON-serializable keyword arguments for the task
+        dedupe_key: Unique key of the event; duplicates are ignored
+    """
+    publish_many([build_message(topic, payload, dedupe_key)])
+
+
+def publish_telegram_message(
+        text: str,
+        dedupe_key: str,
+        chat_id: str = None
+) -> None:
+    """Queue a Telegram message through the outbox."""
+    publish_many([build_telegram_message(text, dedupe_key, chat_id)])
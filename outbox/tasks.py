@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from celery import current_app, shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from outbox.models import OutboxMessage
+from outbox.service import TOPIC_TASKS
+
+
+@shared_task
+def relay_outbox(batch_size: int = None) -> int:
+    """
+    Hand pending outbox messages to their Celery tasks.
+
+    Each batch is locked with ``SKIP LOCKED``, so several relays can run
+    side by side, and is marked dispatched only after every message in
+    it was sent. A crash in between sends the batch again: delivery is
+    at least once and consumers deduplicate on ``dedupe_key``.
+    Returns:
+        int: Number of messages relayed
+    """
+    batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+    relayed = 0
+
+    while True:
+        with transaction.atomic():
+            messages = list(
+                OutboxMessage.objects.filter(
+                    dispatched_at__isnull=True
+                ).select_for_update(
+                    skip_locked=True
+                ).order_by("id")[:batch_size]
+            )
+            for message in messages:
+                current_app.send_task(
+                    TOPIC_TASKS[message.topic],
+                    kwargs=message.payload,
+                )
+            OutboxMessage.objects.filter(
+                pk__in=[message.pk for message in messages]
+            ).update(dispatched_at=Now())
+
+        relayed += len(messages)
+        if len(messages) < batch_size:
+            return relayed
+
+
+@shared_task
+def purge_outbox() -> int:
+    """Delete dispatched messages older than ``OUTBOX_RETENTION_DAYS``."""
+    cutoff = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    deleted, _ = OutboxMessage.objects.filter(
+        dispatched_at__lt=cutoff
+    ).delete()
+    return deleted
@@ -0,0 +1,71 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+
+from outbox.models import OutboxMessage
+from outbox.service import publish, publish_telegram_message
+from outbox.tasks import purge_outbox, relay_outbox
+from telegram_bot.tasks import send_telegram_message_task
+
+
+class OutboxPublishTest(TestCase):
+    def test_publish_ignores_duplicate_keys(self):
+        publish_telegram_message("Hello", dedupe_key="greeting")
+        publish_telegram_message("Hello again", dedupe_key="greeting")
+
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.payload["text"], "Hello")
+        self.assertIsNone(message.dispatched_at)
+
+    def test_publish_unknown_topic(self):
+        with self.assertRaises(ValueError):
+            publish("email.message", {}, dedupe_key="unknown")
+
+
+@patch("outbox.tasks.current_app.send_task")
+class OutboxRelayTest(TestCase):
+    def setUp(self):
+        for i in range(5):
+            publish_telegram_message(f"Message {i}", dedupe_key=f"key-{i}")
+
+    def test_relay_sends_pending_in_batches(self, mock_send):
+        self.assertEqual(relay_outbox(batch_size=2), 5)
+
+        self.assertEqual(mock_send.call_count, 5)
+        task_name, = mock_send.call_args.args
+        self.assertEqual(
+            task_name, "telegram_bot.tasks.send_telegram_message_task"
+        )
+        self.assertEqual(mock_send.call_args.kwargs["kwargs"]["text"],
+                         "Message 4")
+        self.assertFalse(
+            OutboxMessage.objects.filter(dispatched_at__isnull=True).exists()
+        )
+        self.assertEqual(relay_outbox(), 0)
+
+    def test_relay_keeps_batch_when_broker_fails(self, mock_send):
+        mock_send.side_effect = [None, ConnectionError("broker down")]
+
+        with self.assertRaises(ConnectionError):
+            relay_outbox()
+        self.assertFalse(
+            OutboxMessage.objects.filter(dispatched_at__isnull=False).exists()
+        )
+
+    def test_purge_removes_old_dispatched(self, mock_send):
+        relay_outbox()
+        OutboxMessage.objects.filter(dedupe_key="key-0").update(
+            dispatched_at=timezone.now() - timedelta(days=30)
+        )
+        self.assertEqual(purge_outbox(), 1)
+        self.assertEqual(OutboxMessage.objects.count(), 4)
+
+
+class TelegramConsumerDedupeTest(TestCase):
+    @patch("telegram_bot.tasks.send_telegram_message")
+    def test_duplicate_delivery_is_sent_once(self, mock_send):
+        send_telegram_message_task.run("Hi", dedupe_key="dedupe-test")
+        send_telegram_message_task.run("Hi", dedupe_key="dedupe-test")
+        mock_send.assert_called_once()
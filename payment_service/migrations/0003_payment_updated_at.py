@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_service', '0002_alter_payment_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
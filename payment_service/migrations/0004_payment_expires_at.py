@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowings', '0008_overduecheck_since'),
+        ('payment_service', '0003_payment_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['expires_at'], name='payment_pending_expires_idx'),
+        ),
+    ]
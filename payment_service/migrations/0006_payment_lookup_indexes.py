@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:52
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('borrowings', '0008_overduecheck_since'),
+        ('payment_service', '0005_stripeevent'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['status', 'type'], name='payment_status_type_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['borrowing', 'status'], name='payment_borrowing_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('session_id', ''), _negated=True), fields=('session_id',), name='payment_session_id_unique'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='borrowing',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='borrowings.borrowing'),
+        ),
+    ]
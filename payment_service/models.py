@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Now
 from decimal import Decimal
 from borrowings.models import Borrowing
+from payment_service.notifications import publish_expired, publish_paid
 
 
 class Payment(models.Model):
@@ -16,7 +18,9 @@ class Payment(models.Model):
     borrowing = models.ForeignKey(
         Borrowing,
         on_delete=models.CASCADE,
-        related_name="payments"
+        related_name="payments",
+        # Covered by payment_borrowing_status_idx
+        db_index=False
     )
     session_id = models.CharField(
         max_length=255
@@ -39,9 +43,134 @@ class Payment(models.Model):
         choices=Type.choices,
         default=Type.PAYMENT
     )
+    expires_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
     created_at = models.DateTimeField(
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["expires_at"],
+                name="payment_pending_expires_idx",
+                condition=models.Q(status="PENDING")
+            ),
+            models.Index(
+                fields=["status", "type"],
+                name="payment_status_type_idx"
+            ),
+            models.Index(
+                fields=["borrowing", "status"],
+                name="payment_borrowing_status_idx"
+            ),
+        ]
+        constraints = [
+            # Payments waiting for their checkout session have no id yet
+            models.UniqueConstraint(
+                fields=["session_id"],
+                condition=~models.Q(session_id=""),
+                name="payment_session_id_unique"
+            ),
+        ]
+
+    def mark_paid(self) -> bool:
+        """
+        Record a completed payment exactly once.
+
+        A paid borrowing fee also returns the borrowing, whether the
+        webhook or the success page records it first. The staff chat and
+        the payer are notified through the outbox in the same
+        transaction.
+        Returns:
+            bool: False if the payment was already paid
+        """
+        with transaction.atomic():
+            paid = Payment.objects.filter(pk=self.pk).exclude(
+                status=Payment.Status.PAID
+            ).update(
+                status=Payment.Status.PAID,
+                updated_at=Now()
+            )
+            if not paid:
+                return False
+
+            self.status = Payment.Status.PAID
+            if self.type == Payment.Type.PAYMENT:
+                self.borrowing.mark_returned()
+            publish_paid(self, self.borrowing.user_id)
+        return True
+
+    def mark_expired(self) -> bool:
+        """
+        Expire a pending payment and notify the staff chat and payer.
+        Returns:
+            bool: False if the payment was no longer pending
+        """
+        with transaction.atomic():
+            expired = Payment.objects.filter(
+                pk=self.pk,
+                status=Payment.Status.PENDING
+            ).update(
+                status=Payment.Status.EXPIRED,
+                updated_at=Now()
+            )
+            if not expired:
+                return False
+
+            self.status = Payment.Status.EXPIRED
+            publish_expired([(
+                self.id, self.borrowing_id, self.money_to_pay, self.type,
+                self.borrowing.user_id
+            )])
+        return True
 
     def __str__(self):
         return f"Payment {self.status} for borrowing {self.borrowing.id}"
+
+
+class StripeEvent(models.Model):
+    """
+    Raw Stripe webhook event, stored once per Stripe event id.
+
+    The webhook only verifies and stores events; ``process_stripe_events``
+    applies them in Stripe's order, one checkout session at a time.
+    """
+
+    event_id = models.CharField(
+        max_length=255,
+        unique=True
+    )
+    type = models.CharField(
+        max_length=100
+    )
+    session_id = models.CharField(
+        max_length=255,
+        blank=True
+    )
+    payload = models.JSONField()
+    created = models.DateTimeField()
+    received_at = models.DateTimeField(
+        auto_now_add=True
+    )
+    processed_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["session_id", "created"],
+                name="stripe_event_pending_idx",
+                condition=models.Q(processed_at__isnull=True)
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
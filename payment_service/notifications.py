@@ -0,0 +1,71 @@
+from outbox.service import build_telegram_message, publish_many
+from telegram_bot.notifications import (
+    Notification,
+    notify_users,
+    user_dedupe_key,
+)
+
+
+def paid_message_text(payment):
+    return (
+        f"Payment completed successfully!\n"
+        f"Borrowing ID: #{payment.borrowing_id}\n"
+        f"Amount: ${payment.money_to_pay}\n"
+        f"Type: {payment.type}\n"
+        f"Date: {payment.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
+    )
+
+
+def expired_message_text(borrowing_id, money_to_pay, payment_type):
+    return (
+        f"Payment session for borrowing "
+        f"#{borrowing_id} has expired.\n"
+        f"Amount: ${money_to_pay}\n"
+        f"Type: {payment_type}\n"
+        f"You can create a new payment session "
+        f"to complete the payment."
+    )
+
+
+def build_paid_message(payment):
+    return build_telegram_message(
+        paid_message_text(payment),
+        dedupe_key=f"payment-{payment.id}-paid",
+    )
+
+
+def build_expired_message(payment_id, borrowing_id, money_to_pay,
+                          payment_type):
+    return build_telegram_message(
+        expired_message_text(borrowing_id, money_to_pay, payment_type),
+        dedupe_key=f"payment-{payment_id}-expired",
+    )
+
+
+def publish_paid(payment, user_id):
+    """Notify the staff chat and the payer's own chat of a payment"""
+    publish_many([build_paid_message(payment)])
+    notify_users([Notification(
+        user_id,
+        paid_message_text(payment),
+        user_dedupe_key(f"payment-{payment.id}-paid"),
+    )])
+
+
+def publish_expired(rows):
+    """
+    Notify the staff chat and each payer of expired payments.
+    Args:
+        rows: Sequence of (payment_id, borrowing_id, money_to_pay,
+            payment_type, user_id)
+    """
+    publish_many([build_expired_message(*row[:4]) for row in rows])
+    notify_users(
+        Notification(
+            user_id,
+            expired_message_text(borrowing_id, money_to_pay, payment_type),
+            user_dedupe_key(f"payment-{payment_id}-expired"),
+        )
+        for payment_id, borrowing_id, money_to_pay, payment_type, user_id
+        in rows
+    )
@@ -18,6 +18,18 @@ payment_retrieve_schema = extend_schema(
     responses={200: PaymentSerializer},
 )
 
+payment_checkout_schema = extend_schema(
+    summary="Poll a payment checkout",
+    description=(
+        "Report whether the Stripe checkout session of a payment is "
+        "ready.\n\n"
+        "When borrowings are created in asynchronous mode the session is "
+        "opened by a background worker. Until then `ready` is false and "
+        "`checkout_url` is null."
+    ),
+    responses={200: OpenApiTypes.OBJECT},
+)
+
 start_payment_schema = extend_schema(
     summary="Start a payment session",
     description=(
@@ -35,9 +47,12 @@ payment_success_schema = extend_schema(
     summary="Confirm payment success",
     description=(
         "Check Stripe payment status.\n"
+        "- If already paid or expired: answer from the local state.\n"
         "- If paid: update status to PAID.\n"
         "- If pending: keep as pending.\n"
-        "- Restricted to borrower or admin."
+        "- Restricted to borrower or admin.\n\n"
+        "Stripe answers are cached for a few seconds and shared "
+        "between concurrent requests."
     ),
     responses={200: OpenApiTypes.OBJECT}
 )
@@ -50,8 +65,12 @@ payment_cancel_schema = extend_schema(
 
 stripe_webhook_schema = extend_schema(
     summary="Stripe webhook handler",
-    description="Receives webhook events from "
-                "Stripe and updates payment status.",
+    description=(
+        "Receives webhook events from Stripe.\n\n"
+        "Verified checkout session events are stored once per Stripe "
+        "event id and applied to the payment by a background worker. "
+        "Duplicate deliveries are acknowledged without further work."
+    ),
     responses={200: None}
 )
 
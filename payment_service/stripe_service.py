@@ -1,38 +1,42 @@
+import time
+
 import stripe
 from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse
 from payment_service.models import Payment
 from decimal import Decimal
-from typing import Optional
+from typing import Tuple
 from django.core.exceptions import ValidationError
-from datetime import datetime, timezone, timedelta
+from datetime import timedelta
 
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+# Stripe allows checkout sessions to live for at most 24 hours
+SESSION_LIFETIME = timedelta(hours=23)
+
 
 class StripeSessionError(Exception):
     """Custom exception for Stripe session creation errors"""
     pass
 
 
-def create_stripe_checkout_session(
+def create_pending_payment(
         borrowing,
         amount: Decimal,
-        payment_type: str,
-        request
+        payment_type: str
 ) -> Payment:
     """
-    Create a Stripe checkout session for payment.
+    Create a pending payment without a Stripe session yet.
     Args:
         borrowing: The borrowing instance
         amount: The amount to charge
         payment_type: Type of payment (PAYMENT or FINE)
-        request: The request object for building absolute URLs
     Returns:
-        Payment: Created payment instance
+        Payment: Payment with empty session_id and session_url
     Raises:
-        StripeSessionError: If there's an error creating the Stripe session
+        StripeSessionError: If the payment record cannot be created
         ValidationError: If input validation fails
     """
     if amount <= 0:
@@ -58,12 +62,46 @@ def create_stripe_checkout_session(
     except Exception as e:
         raise StripeSessionError(f"Failed to create payment record: {str(e)}")
 
+    return payment
+
+
+def build_payment_urls(payment: Payment, request) -> Tuple[str, str]:
+    """Return absolute Stripe success and cancel URLs for a payment."""
     success_url = request.build_absolute_uri(
         reverse('payment-success', kwargs={'payment_id': payment.id})
     )
     cancel_url = request.build_absolute_uri(
         reverse('payment-cancel')
     )
+    return success_url, cancel_url
+
+
+def start_checkout_session(
+        payment: Payment,
+        success_url: str,
+        cancel_url: str
+) -> Payment:
+    """
+    Open a Stripe checkout session for an existing pending payment.
+
+    The payment id is sent as the idempotency key, so retrying after a
+    timeout returns the same session instead of opening a second one.
+    Stripe only honours the key when every parameter matches, so the
+    expiry is derived from ``payment.created_at`` rather than the time
+    of the attempt.
+    Args:
+        payment: Pending payment without a session
+        success_url: Absolute URL Stripe redirects to after payment
+        cancel_url: Absolute URL Stripe redirects to on cancel
+    Returns:
+        Payment: The payment with session_id and session_url filled in
+    Raises:
+        StripeSessionError: If there's an error creating the Stripe session
+    """
+    borrowing = payment.borrowing
+    amount = payment.money_to_pay
+    payment_type = payment.type
+    expires_at = payment.created_at + SESSION_LIFETIME
 
     try:
         session = stripe.checkout.Session.create(
@@ -81,23 +119,92 @@ def create_stripe_checkout_session(
             mode='payment',
             success_url=success_url,
             cancel_url=cancel_url,
-            customer_email=user_email,
-            expires_at=int((datetime.now(timezone.utc) + timedelta(hours=23)).timestamp()),  # noqa
+            customer_email=borrowing.user.email,
+            expires_at=int(expires_at.timestamp()),
+            idempotency_key=f"payment-{payment.id}-checkout",
         )
 
         payment.session_id = session.id
         payment.session_url = session.url
+        payment.expires_at = expires_at
         payment.save()
 
     except stripe.error.StripeError as e:
-        payment.delete()
         raise StripeSessionError(
             f"Failed to create Stripe session: {str(e)}"
         )
     except Exception as e:
-        payment.delete()
         raise StripeSessionError(
             f"Unexpected error creating Stripe session: {str(e)}"
         )
 
     return payment
+
+
+def create_stripe_checkout_session(
+        borrowing,
+        amount: Decimal,
+        payment_type: str,
+        request
+) -> Payment:
+    """
+    Create a Stripe checkout session for payment.
+    Args:
+        borrowing: The borrowing instance
+        amount: The amount to charge
+        payment_type: Type of payment (PAYMENT or FINE)
+        request: The request object for building absolute URLs
+    Returns:
+        Payment: Created payment instance
+    Raises:
+        StripeSessionError: If there's an error creating the Stripe session
+        ValidationError: If input validation fails
+    """
+    payment = create_pending_payment(borrowing, amount, payment_type)
+    success_url, cancel_url = build_payment_urls(payment, request)
+
+    try:
+        return start_checkout_session(payment, success_url, cancel_url)
+    except StripeSessionError:
+        payment.delete()
+        raise
+
+
+def get_session_payment_status(session_id: str) -> str:
+    """
+    Return the Stripe ``payment_status`` of a checkout session.
+
+    The answer is cached for ``STRIPE_SESSION_CACHE_TIMEOUT`` seconds.
+    On a miss only the caller that takes the lock asks Stripe; the
+    others wait for its result, so concurrent refreshes of one payment
+    cost a single API call.
+    Raises:
+        stripe.error.StripeError: If Stripe cannot be reached
+    """
+    cache_key = f"stripe:session:{session_id}:payment_status"
+    lock_key = f"{cache_key}:lock"
+
+    payment_status = cache.get(cache_key)
+    if payment_status is not None:
+        return payment_status
+
+    locked = cache.add(lock_key, True, settings.STRIPE_SESSION_LOCK_TIMEOUT)
+    if not locked:
+        deadline = time.monotonic() + settings.STRIPE_SESSION_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            payment_status = cache.get(cache_key)
+            if payment_status is not None:
+                return payment_status
+
+    try:
+        session = stripe.checkout.Session.retrieve(session_id)
+        cache.set(
+            cache_key,
+            session.payment_status,
+            settings.STRIPE_SESSION_CACHE_TIMEOUT
+        )
+        return session.payment_status
+    finally:
+        if locked:
+            cache.delete(lock_key)
@@ -1,37 +1,337 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+
 import stripe
+from celery import shared_task
 from django.conf import settings
-from payment_service.models import Payment
-from telegram_bot.telegram import send_telegram_message
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
+from payment_service.models import Payment, StripeEvent
+from payment_service.notifications import publish_expired
+from payment_service.stripe_service import (
+    start_checkout_session,
+    StripeSessionError
+)
 
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+logger = logging.getLogger(__name__)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
 
-def check_expired_sessions():
+@shared_task(bind=True, max_retries=5)
+def create_checkout_session(self, payment_id, success_url, cancel_url):
     """
-    Check for expired Stripe sessions and update payment statuses.
-    This task should be scheduled to run every minute.
+    Open the Stripe session for a payment created without one.
+
+    Failures are retried with exponential backoff. Once the retries are
+    used up the payment is marked as expired, so the borrower can renew
+    it through the usual renew endpoint.
     """
-    pending_payments = Payment.objects.filter(status=Payment.Status.PENDING)
+    payment = Payment.objects.select_related("borrowing__user").filter(
+        pk=payment_id,
+        status=Payment.Status.PENDING,
+        session_id=""
+    ).first()
+    if payment is None:
+        return
+
+    try:
+        start_checkout_session(payment, success_url, cancel_url)
+    except StripeSessionError as e:
+        if self.request.retries >= self.max_retries:
+            payment.status = Payment.Status.EXPIRED
+            payment.save()
+            return
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
+
+
+def expire_pending_payments(batch_size: int = None) -> int:
+    """
+    Expire pending payments whose session lifetime has passed locally.
+
+    Each batch is one locking SELECT over the partial expiry index, one
+    bulk UPDATE and one outbox INSERT. ``PAYMENT_EXPIRY_GRACE`` leaves
+    time for a late completion webhook before a payment is given up.
+    Returns:
+        int: Number of payments expired
+    """
+    batch_size = batch_size or settings.PAYMENT_EXPIRY_BATCH_SIZE
+    cutoff = timezone.now() - settings.PAYMENT_EXPIRY_GRACE
+    expired = 0
+
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Payment.objects.filter(
+                    status=Payment.Status.PENDING,
+                    expires_at__lt=cutoff
+                ).select_for_update(
+                    skip_locked=True,
+                    of=("self",)
+                ).order_by("expires_at").values_list(
+                    "id", "borrowing_id", "money_to_pay", "type",
+                    "borrowing__user_id"
+                )[:batch_size]
+            )
+            Payment.objects.filter(
+                pk__in=[row[0] for row in rows]
+            ).update(
+                status=Payment.Status.EXPIRED,
+                updated_at=Now()
+            )
+            publish_expired(rows)
 
-    for payment in pending_payments:
-        try:
-            session = stripe.checkout.Session.retrieve(payment.session_id)
+        expired += len(rows)
+        if len(rows) < batch_size:
+            return expired
 
-            if session.status == 'expired':
-                payment.status = Payment.Status.EXPIRED
-                payment.save()
 
-                message = (
-                    f"Payment session for borrowing "
-                    f"#{payment.borrowing.id} has expired.\n"
-                    f"Amount: ${payment.money_to_pay}\n"
-                    f"Type: {payment.type}\n"
-                    f"You can create a new payment session "
-                    f"to complete the payment."
+def unknown_sessions():
+    """
+    Pending sessions without a local expiry time, i.e. payments created
+    before ``expires_at`` was stored. Only these still need Stripe.
+    """
+    return Payment.objects.filter(
+        status=Payment.Status.PENDING,
+        expires_at__isnull=True
+    ).exclude(session_id="")
+
+
+def fetch_sessions(payments):
+    """
+    Retrieve the Stripe sessions of ``payments`` concurrently.
+    Returns:
+        tuple: List of (payment, session) pairs and the number of
+        sessions Stripe failed to return
+    """
+    results = []
+    errors = 0
+    workers = settings.STRIPE_RECONCILE_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(stripe.checkout.Session.retrieve, payment.session_id):
+                payment
+            for payment in payments
+        }
+        for future in as_completed(futures):
+            try:
+                results.append((futures[future], future.result()))
+            except stripe.error.StripeError as e:
+                errors += 1
+                logger.warning(
+                    "Error checking session %s: %s",
+                    futures[future].session_id, e
                 )
-                send_telegram_message(message)
+    return results, errors
 
-        except stripe.error.StripeError as e:
-            print(f"Error checking session {payment.session_id}: {str(e)}")
+
+@shared_task
+def reconcile_sessions(start_id: int, end_id: int) -> dict:
+    """
+    Reconcile one shard of unknown sessions, ids in ``[start_id, end_id]``.
+
+    Sessions are fetched by a bounded thread pool. Expired ones are
+    closed with one bulk UPDATE and one outbox INSERT. Every other
+    session gets its Stripe expiry stored, so later runs leave it to
+    the local expiry instead of asking Stripe again, and a paid one
+    whose webhook never arrived is marked as paid.
+    Only rows still pending once locked are expired and announced; a
+    payment paid by a webhook in the meantime is left alone.
+    Returns:
+        dict: Throughput and error metrics of the shard
+    """
+    started = time.monotonic()
+    payments = list(
+        unknown_sessions().filter(
+            id__gte=start_id,
+            id__lte=end_id
+        ).only(
+            "id", "borrowing_id", "money_to_pay", "type", "session_id"
+        ).annotate(user_id=F("borrowing__user_id"))
+    )
+    results, errors = fetch_sessions(payments)
+
+    expired = []
+    with_expiry = []
+    paid = []
+    now = timezone.now()
+    for payment, session in results:
+        if session.status == "expired":
+            expired.append(payment)
             continue
+        payment.expires_at = datetime.fromtimestamp(
+            session.expires_at, tz=dt_timezone.utc
+        )
+        payment.updated_at = now
+        with_expiry.append(payment)
+        if session.payment_status == "paid":
+            paid.append(payment)
+
+    with transaction.atomic():
+        pending_ids = set(
+            Payment.objects.filter(
+                pk__in=[payment.id for payment in expired],
+                status=Payment.Status.PENDING
+            ).select_for_update(
+                skip_locked=True
+            ).values_list("id", flat=True)
+        )
+        expired = [
+            payment for payment in expired if payment.id in pending_ids
+        ]
+        Payment.objects.filter(pk__in=pending_ids).update(
+            status=Payment.Status.EXPIRED,
+            updated_at=Now()
+        )
+        publish_expired([
+            (
+                payment.id,
+                payment.borrowing_id,
+                payment.money_to_pay,
+                payment.type,
+                payment.user_id
+            )
+            for payment in expired
+        ])
+        Payment.objects.bulk_update(with_expiry, ["expires_at", "updated_at"])
+
+    marked_paid = sum(payment.mark_paid() for payment in paid)
+
+    elapsed = time.monotonic() - started
+    metrics = {
+        "checked": len(results),
+        "expired": len(expired),
+        "updated": len(with_expiry),
+        "paid": marked_paid,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(payments) / elapsed, 1) if elapsed else 0,
+    }
+    logger.info("Reconciled sessions %s-%s: %s", start_id, end_id, metrics)
+    return metrics
+
+
+@shared_task
+def check_expired_sessions() -> dict:
+    """
+    Expire pending payments past their local expiry time and fan the
+    payments that still need Stripe out to ``reconcile_sessions``
+    shards of ``STRIPE_RECONCILE_SHARD_SIZE`` payments.
+    This task should be scheduled to run every minute.
+    """
+    expired = expire_pending_payments()
+
+    shards = 0
+    ids = unknown_sessions().order_by("id").values_list("id", flat=True)
+    for shard in batched(ids.iterator(), settings.STRIPE_RECONCILE_SHARD_SIZE):
+        reconcile_sessions.delay(shard[0], shard[-1])
+        shards += 1
+
+    metrics = {"expired": expired, "shards": shards}
+    logger.info("Checked expired sessions: %s", metrics)
+    return metrics
+
+
+PAID_EVENTS = {
+    "checkout.session.async_payment_succeeded",
+}
+EXPIRED_EVENTS = {
+    "checkout.session.expired",
+    "checkout.session.async_payment_failed",
+}
+HANDLED_STRIPE_EVENTS = {
+    "checkout.session.completed",
+    *PAID_EVENTS,
+    *EXPIRED_EVENTS,
+}
+
+
+def apply_stripe_event(payment: Payment, event: StripeEvent) -> None:
+    if event.type == "checkout.session.completed":
+        # Delayed payment methods complete the session before the money
+        # arrives and send async_payment_succeeded once it does
+        session = event.payload["data"]["object"]
+        if session.get("payment_status") == "paid":
+            payment.mark_paid()
+    elif event.type in PAID_EVENTS:
+        payment.mark_paid()
+    elif event.type in EXPIRED_EVENTS:
+        payment.mark_expired()
+
+
+@shared_task
+def process_stripe_events(session_id: str) -> int:
+    """
+    Apply the stored webhook events of one checkout session.
+
+    The payment row is locked for the whole run, so events of one
+    session are applied one task at a time and in Stripe's order.
+    Events that were already processed are skipped, which makes
+    duplicate deliveries and repeated tasks no-ops. Events that arrive
+    before their payment row is committed stay unprocessed, so
+    ``process_pending_stripe_events`` retries them; they are dropped
+    only after ``STRIPE_EVENT_ORPHAN_AFTER``.
+    Returns:
+        int: Number of events processed
+    """
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update(
+            of=("self",)
+        ).select_related("borrowing").filter(session_id=session_id).first()
+        events = list(
+            StripeEvent.objects.select_for_update().filter(
+                session_id=session_id,
+                processed_at__isnull=True
+            ).order_by("created", "id")
+        )
+        if payment is None and events:
+            oldest = min(event.received_at for event in events)
+            if oldest > timezone.now() - settings.STRIPE_EVENT_ORPHAN_AFTER:
+                logger.warning(
+                    "No payment for session %s yet, %d events left "
+                    "for a retry", session_id, len(events)
+                )
+                return 0
+            logger.error(
+                "No payment for session %s, dropping %d events: %s",
+                session_id, len(events),
+                ", ".join(event.event_id for event in events)
+            )
+        if payment is not None:
+            for event in events:
+                apply_stripe_event(payment, event)
+        StripeEvent.objects.filter(
+            pk__in=[event.pk for event in events]
+        ).update(processed_at=Now())
+    return len(events)
+
+
+@shared_task
+def process_pending_stripe_events() -> int:
+    """
+    Re-enqueue sessions whose events were stored but never processed,
+    e.g. because the broker was down when the webhook arrived.
+    """
+    cutoff = timezone.now() - settings.STRIPE_EVENT_RETRY_AFTER
+    session_ids = StripeEvent.objects.filter(
+        processed_at__isnull=True,
+        received_at__lt=cutoff
+    ).order_by().values_list("session_id", flat=True).distinct()
+
+    count = 0
+    for session_id in session_ids:
+        process_stripe_events.delay(session_id)
+        count += 1
+    return count
@@ -1,4 +1,11 @@
-from django.test import TestCase
+import json
+import stripe
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -6,12 +13,26 @@ from rest_framework import status
 from decimal import Decimal
 from unittest.mock import patch, MagicMock
 
-from payment_service.models import Payment
+from payment_service.models import Payment, StripeEvent
 from payment_service.serializers import PaymentSerializer
+from payment_service.stripe_service import (
+    SESSION_LIFETIME,
+    get_session_payment_status
+)
 from payment_service.permissions import IsOwnerOrAdmin, IsAdminOrReadOnly
+from payment_service.tasks import (
+    check_expired_sessions,
+    create_checkout_session,
+    expire_pending_payments,
+    process_stripe_events,
+    reconcile_sessions,
+    unknown_sessions
+)
+from outbox.models import OutboxMessage
 from borrowings.models import Borrowing
 from books.models import Book
 from django.contrib.auth import get_user_model
+from library_service.testing import IndexPlanTestCase
 
 
 User = get_user_model()
@@ -432,6 +453,7 @@ class PaymentPermissionsTest(TestCase):
 
 class PaymentProcessingTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = User.objects.create_user(
             email="user@test.com",
@@ -583,6 +605,128 @@ class PaymentProcessingTest(TestCase):
             Payment.Status.PENDING
         )
 
+    @patch('payment_service.stripe_service.stripe.checkout.Session.create')
+    def test_create_checkout_session_task(self, mock_create):
+        payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            session_id="",
+            session_url="",
+            money_to_pay=Decimal("50.00")
+        )
+        checkout_url = reverse(
+            "payment-checkout",
+            kwargs={"pk": payment.id}
+        )
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(checkout_url)
+        self.assertFalse(response.data["ready"])
+        self.assertIsNone(response.data["checkout_url"])
+
+        mock_session = MagicMock()
+        mock_session.id = "test_session_id"
+        mock_session.url = "https://test.com/session"
+        mock_create.return_value = mock_session
+
+        create_checkout_session.apply(
+            args=(payment.id, "https://test.com/ok", "https://test.com/no")
+        )
+        create_checkout_session.apply(
+            args=(payment.id, "https://test.com/ok", "https://test.com/no")
+        )
+        mock_create.assert_called_once()
+        self.assertEqual(
+            mock_create.call_args.kwargs["idempotency_key"],
+            f"payment-{payment.id}-checkout"
+        )
+
+        payment.refresh_from_db()
+        self.assertIsNotNone(payment.expires_at)
+        response = self.client.get(checkout_url)
+        self.assertTrue(response.data["ready"])
+        self.assertEqual(
+            response.data["checkout_url"],
+            "https://test.com/session"
+        )
+
+    @patch('payment_service.stripe_service.stripe.checkout.Session.create')
+    def test_checkout_retry_sends_identical_parameters(self, mock_create):
+        payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            session_id="",
+            session_url="",
+            money_to_pay=Decimal("50.00")
+        )
+        # Queued a while ago: the expiry must not follow the clock
+        Payment.objects.filter(pk=payment.pk).update(
+            created_at=timezone.now() - timezone.timedelta(hours=1)
+        )
+        payment.refresh_from_db()
+        mock_session = MagicMock()
+        mock_session.id = "retried_session_id"
+        mock_session.url = "https://test.com/retried"
+        mock_create.side_effect = [
+            stripe.error.APIConnectionError("timeout"),
+            mock_session,
+        ]
+
+        create_checkout_session.apply(
+            args=(payment.id, "https://test.com/ok", "https://test.com/no")
+        )
+
+        self.assertEqual(mock_create.call_count, 2)
+        first, second = mock_create.call_args_list
+        self.assertEqual(first.kwargs, second.kwargs)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.Status.PENDING)
+        self.assertEqual(payment.session_id, "retried_session_id")
+        self.assertEqual(
+            payment.expires_at, payment.created_at + SESSION_LIFETIME
+        )
+        self.assertEqual(
+            int(payment.expires_at.timestamp()),
+            first.kwargs["expires_at"]
+        )
+
+    @patch('payment_service.stripe_service.stripe.checkout.Session.retrieve')
+    def test_payment_success_already_paid_skips_stripe(self, mock_retrieve):
+        payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            session_id="test_session_id",
+            session_url="https://test.com/session",
+            money_to_pay=Decimal("50.00"),
+            status=Payment.Status.PAID
+        )
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse(
+                "payment-success",
+                kwargs={"payment_id": payment.id}
+            )
+        )
+        self.assertEqual(response.data["status"], "success")
+        mock_retrieve.assert_not_called()
+
+    @patch('payment_service.stripe_service.stripe.checkout.Session.retrieve')
+    def test_session_status_single_flight(self, mock_retrieve):
+        def slow_retrieve(session_id):
+            time.sleep(0.2)
+            return MagicMock(payment_status="unpaid")
+
+        mock_retrieve.side_effect = slow_retrieve
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            statuses = list(pool.map(
+                get_session_payment_status, ["test_session_id"] * 5
+            ))
+
+        self.assertEqual(statuses, ["unpaid"] * 5)
+        mock_retrieve.assert_called_once_with("test_session_id")
+
+        self.assertEqual(
+            get_session_payment_status("test_session_id"), "unpaid"
+        )
+        mock_retrieve.assert_called_once()
+
     def test_payment_cancel(self):
         self.client.force_authenticate(
             user=self.user
@@ -598,3 +742,443 @@ class PaymentProcessingTest(TestCase):
             response.data["status"],
             "cancelled"
         )
+
+
+class PaymentExpiryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="password",
+            first_name="Test",
+            last_name="User"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            daily_fee=Decimal("10.00"),
+            inventory=5,
+            cover="HARD"
+        )
+        self.borrowing = Borrowing.objects.create(
+            expected_return_date=timezone.now() + timezone.timedelta(days=5),
+            book=self.book,
+            user=self.user
+        )
+
+    def create_payment(self, expires_at, session_id=None):
+        return Payment.objects.create(
+            borrowing=self.borrowing,
+            session_id=session_id or f"session_{Payment.objects.count()}",
+            session_url="https://test.com/session",
+            money_to_pay=Decimal("50.00"),
+            expires_at=expires_at
+        )
+
+    def test_expire_pending_payments_in_bulk(self):
+        expired = [
+            self.create_payment(timezone.now() - timezone.timedelta(hours=1))
+            for _ in range(3)
+        ]
+        active = self.create_payment(
+            timezone.now() + timezone.timedelta(hours=1)
+        )
+
+        # Locking SELECT, bulk UPDATE, outbox INSERT and the recipient
+        # lookup in a savepoint
+        with self.assertNumQueries(6) as queries:
+            self.assertEqual(expire_pending_payments(batch_size=10), 3)
+
+        # The joined borrowing rows must stay unlocked for mark_returned
+        self.assertTrue(any(
+            f'FOR UPDATE OF "{Payment._meta.db_table}" SKIP LOCKED'
+            in query["sql"]
+            for query in queries.captured_queries
+        ))
+
+        for payment in expired:
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, Payment.Status.EXPIRED)
+        active.refresh_from_db()
+        self.assertEqual(active.status, Payment.Status.PENDING)
+        self.assertEqual(
+            OutboxMessage.objects.filter(
+                dedupe_key__endswith="-expired"
+            ).count(),
+            3
+        )
+
+    @patch('payment_service.tasks.stripe.checkout.Session.retrieve')
+    def test_only_sessions_without_expiry_ask_stripe(self, mock_retrieve):
+        self.create_payment(timezone.now() + timezone.timedelta(hours=1))
+        unknown = self.create_payment(None, session_id="legacy_session")
+        expires_at = timezone.now() + timezone.timedelta(hours=2)
+        mock_retrieve.return_value = MagicMock(
+            status="open",
+            expires_at=int(expires_at.timestamp())
+        )
+
+        with patch(
+                'payment_service.tasks.reconcile_sessions.delay',
+                side_effect=reconcile_sessions
+        ):
+            check_expired_sessions()
+
+        mock_retrieve.assert_called_once_with("legacy_session")
+        unknown.refresh_from_db()
+        self.assertEqual(unknown.status, Payment.Status.PENDING)
+        self.assertEqual(
+            int(unknown.expires_at.timestamp()),
+            int(expires_at.timestamp())
+        )
+
+    @override_settings(STRIPE_RECONCILE_SHARD_SIZE=2)
+    @patch('payment_service.tasks.reconcile_sessions.delay')
+    def test_unknown_sessions_sharded_by_id(self, mock_delay):
+        payments = [
+            self.create_payment(None, session_id=f"session_{i}")
+            for i in range(3)
+        ]
+
+        self.assertEqual(check_expired_sessions()["shards"], 2)
+        self.assertEqual(
+            [call.args for call in mock_delay.call_args_list],
+            [
+                (payments[0].id, payments[1].id),
+                (payments[2].id, payments[2].id),
+            ]
+        )
+
+    @patch('payment_service.tasks.stripe.checkout.Session.retrieve')
+    def test_reconcile_shard_updates_in_bulk(self, mock_retrieve):
+        payments = [
+            self.create_payment(None, session_id=f"session_{i}")
+            for i in range(3)
+        ]
+        sessions = {
+            "session_0": MagicMock(status="expired"),
+            "session_1": MagicMock(
+                status="complete",
+                payment_status="unpaid",
+                expires_at=int(timezone.now().timestamp())
+            ),
+        }
+
+        def retrieve(session_id):
+            if session_id not in sessions:
+                raise stripe.error.APIConnectionError("timeout")
+            return sessions[session_id]
+
+        mock_retrieve.side_effect = retrieve
+
+        with self.assertLogs("payment_service.tasks", "WARNING"):
+            metrics = reconcile_sessions(payments[0].id, payments[-1].id)
+
+        self.assertEqual(metrics["checked"], 2)
+        self.assertEqual(metrics["expired"], 1)
+        self.assertEqual(metrics["errors"], 1)
+        statuses = [
+            Payment.objects.get(pk=payment.pk).status for payment in payments
+        ]
+        self.assertEqual(statuses, [
+            Payment.Status.EXPIRED,
+            Payment.Status.PENDING,
+            Payment.Status.PENDING,
+        ])
+        self.assertEqual(
+            list(unknown_sessions().values_list("id", flat=True)),
+            [payments[2].id]
+        )
+
+    @patch('payment_service.tasks.stripe.checkout.Session.retrieve')
+    def test_reconcile_marks_completed_session_paid(self, mock_retrieve):
+        payment = self.create_payment(None, session_id="session_complete")
+        expires_at = timezone.now() - timezone.timedelta(hours=1)
+        mock_retrieve.return_value = MagicMock(
+            status="complete",
+            payment_status="paid",
+            expires_at=int(expires_at.timestamp())
+        )
+
+        metrics = reconcile_sessions(payment.id, payment.id)
+
+        self.assertEqual(metrics["paid"], 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.Status.PAID)
+        self.assertIsNotNone(payment.expires_at)
+        self.borrowing.refresh_from_db()
+        self.assertIsNotNone(self.borrowing.actual_return_date)
+        self.assertFalse(unknown_sessions().exists())
+
+    @patch('payment_service.tasks.fetch_sessions')
+    def test_reconcile_skips_payment_paid_meanwhile(self, mock_fetch):
+        payment = self.create_payment(None, session_id="session_paid")
+
+        def fetch(payments):
+            # The completion webhook lands while Stripe is being asked
+            Payment.objects.filter(pk=payment.pk).update(
+                status=Payment.Status.PAID
+            )
+            return [(payments[0], MagicMock(status="expired"))], 0
+
+        mock_fetch.side_effect = fetch
+
+        metrics = reconcile_sessions(payment.id, payment.id)
+
+        self.assertEqual(metrics["expired"], 0)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.Status.PAID)
+        self.assertFalse(
+            OutboxMessage.objects.filter(
+                dedupe_key__startswith=f"payment-{payment.id}-expired"
+            ).exists()
+        )
+
+
+class StripeWebhookTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="password",
+            first_name="Test",
+            last_name="User"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            daily_fee=Decimal("10.00"),
+            inventory=5,
+            cover="HARD"
+        )
+        self.borrowing = Borrowing.objects.create(
+            expected_return_date=timezone.now() + timezone.timedelta(days=5),
+            book=self.book,
+            user=self.user
+        )
+        self.payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            session_id="cs_test_session",
+            session_url="https://test.com/session",
+            money_to_pay=Decimal("50.00")
+        )
+
+    def build_event(self, event_id, event_type, created=1700000000,
+                    payment_status="paid"):
+        return {
+            "id": event_id,
+            "type": event_type,
+            "created": created,
+            "data": {"object": {
+                "id": "cs_test_session",
+                "payment_status": payment_status,
+            }},
+        }
+
+    def post_event(self, event):
+        with patch(
+                'payment_service.views.stripe.Webhook.construct_event',
+                return_value=event
+        ):
+            return self.client.post(
+                reverse("stripe-webhook"),
+                data=json.dumps(event),
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE="signature"
+            )
+
+    @patch('payment_service.views.process_stripe_events.delay')
+    def test_duplicate_delivery_stored_and_enqueued_once(self, mock_delay):
+        event = self.build_event("evt_1", "checkout.session.completed")
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.post_event(event)
+            second = self.post_event(event)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        mock_delay.assert_called_once_with("cs_test_session")
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.PENDING)
+
+    @patch('payment_service.views.process_stripe_events.delay')
+    def test_events_applied_in_stripe_order(self, mock_delay):
+        self.post_event(self.build_event(
+            "evt_2", "checkout.session.async_payment_succeeded", created=20
+        ))
+        self.post_event(self.build_event(
+            "evt_1", "checkout.session.completed", created=10,
+            payment_status="unpaid"
+        ))
+
+        self.assertEqual(process_stripe_events("cs_test_session"), 2)
+        self.assertEqual(process_stripe_events("cs_test_session"), 0)
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.PAID)
+        self.borrowing.refresh_from_db()
+        self.assertIsNotNone(self.borrowing.actual_return_date)
+        self.assertTrue(OutboxMessage.objects.filter(
+            dedupe_key=f"payment-{self.payment.id}-paid"
+        ).exists())
+
+    @patch('payment_service.views.process_stripe_events.delay')
+    def test_expired_event_expires_payment(self, mock_delay):
+        self.post_event(self.build_event("evt_3", "checkout.session.expired"))
+        process_stripe_events("cs_test_session")
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.EXPIRED)
+        self.assertFalse(
+            StripeEvent.objects.filter(processed_at__isnull=True).exists()
+        )
+
+    @patch('payment_service.views.process_stripe_events.delay')
+    def test_paid_webhook_returns_borrowing_once(self, mock_delay):
+        self.post_event(self.build_event(
+            "evt_1", "checkout.session.completed"
+        ))
+        self.post_event(self.build_event(
+            "evt_2", "checkout.session.async_payment_succeeded", created=20
+        ))
+        process_stripe_events("cs_test_session")
+        self.client.force_authenticate(self.user)
+        response = self.client.get(
+            reverse("payment-success", args=[self.payment.id])
+        )
+
+        self.assertEqual(response.data["status"], "success")
+        self.borrowing.refresh_from_db()
+        self.assertIsNotNone(self.borrowing.actual_return_date)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 6)
+
+    @patch('payment_service.views.process_stripe_events.delay')
+    def test_paid_fine_webhook_keeps_borrowing_open(self, mock_delay):
+        Payment.objects.filter(pk=self.payment.pk).update(
+            type=Payment.Type.FINE
+        )
+        self.post_event(self.build_event(
+            "evt_1", "checkout.session.completed"
+        ))
+        process_stripe_events("cs_test_session")
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.PAID)
+        self.borrowing.refresh_from_db()
+        self.assertIsNone(self.borrowing.actual_return_date)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 5)
+
+    def create_orphan_event(self, received_at=None):
+        event = StripeEvent.objects.create(
+            event_id="evt_early",
+            type="checkout.session.completed",
+            session_id="cs_not_committed_yet",
+            payload=self.build_event(
+                "evt_early", "checkout.session.completed"
+            ),
+            created=timezone.now()
+        )
+        if received_at is not None:
+            StripeEvent.objects.filter(pk=event.pk).update(
+                received_at=received_at
+            )
+        return event
+
+    def test_event_before_payment_left_for_retry(self):
+        event = self.create_orphan_event()
+
+        with self.assertLogs("payment_service.tasks", "WARNING"):
+            processed = process_stripe_events("cs_not_committed_yet")
+
+        self.assertEqual(processed, 0)
+        event.refresh_from_db()
+        self.assertIsNone(event.processed_at)
+
+    def test_orphan_event_dropped_after_timeout(self):
+        event = self.create_orphan_event(
+            received_at=timezone.now() - settings.STRIPE_EVENT_ORPHAN_AFTER
+            - timezone.timedelta(minutes=1)
+        )
+
+        with self.assertLogs("payment_service.tasks", "ERROR") as logs:
+            processed = process_stripe_events("cs_not_committed_yet")
+
+        self.assertEqual(processed, 1)
+        self.assertIn("evt_early", logs.output[0])
+        event.refresh_from_db()
+        self.assertIsNotNone(event.processed_at)
+
+
+class PaymentIndexPlanTest(IndexPlanTestCase):
+    """
+    Seed enough payments for the planner to prefer an index and check
+    the session and borrowing lookups never fall back to a Seq Scan.
+    """
+
+    borrowings = 2_000
+    payments = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email="user@test.com",
+            password="password",
+            first_name="Test",
+            last_name="User"
+        )
+        book = Book.objects.create(
+            title="Test Book",
+            author="Author",
+            daily_fee=Decimal("10.00"),
+            inventory=5,
+            cover="HARD"
+        )
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                expected_return_date=(
+                    timezone.now() + timezone.timedelta(days=5)
+                ),
+                book=book,
+                user=user
+            )
+            for _ in range(cls.borrowings)
+        )
+        cls.borrowing = Borrowing.objects.order_by("id").first()
+        cls.seed_rows(Payment, cls.payments, {
+            "borrowing_id": "%s + i %% %s",
+            "session_id": "'cs_' || i",
+            "session_url": "'https://test.com/session'",
+            "money_to_pay": "10",
+            "status": (
+                "CASE WHEN i %% 100 = 0 THEN 'PENDING' ELSE 'PAID' END"
+            ),
+            "type": "CASE WHEN i %% 10 = 0 THEN 'FINE' ELSE 'PAYMENT' END",
+            "created_at": "now()",
+            "updated_at": "now()",
+        }, [cls.borrowing.id, cls.borrowings])
+
+    def test_session_lookup_uses_unique_index(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(session_id="cs_4242"),
+            "payment_session_id_unique"
+        )
+
+    def test_borrowing_status_lookup_uses_composite_index(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(
+                borrowing=self.borrowing,
+                type=Payment.Type.PAYMENT,
+                status=Payment.Status.PAID
+            ),
+            "payment_borrowing_status_idx"
+        )
+
+    def test_status_type_lookup_uses_composite_index(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(
+                status=Payment.Status.EXPIRED,
+                type=Payment.Type.FINE
+            ),
+            "payment_status_type_idx"
+        )
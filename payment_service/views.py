@@ -1,30 +1,38 @@
+import json
 import stripe
 from datetime import datetime, timezone
 from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from telegram_bot.telegram import send_telegram_message
 
 from borrowings.models import Borrowing
-from payment_service.models import Payment
+from payment_service.models import Payment, StripeEvent
+from payment_service.tasks import (
+    HANDLED_STRIPE_EVENTS,
+    process_stripe_events
+)
 from payment_service.serializers import PaymentSerializer
 from payment_service.permissions import IsAdminOrReadOnly
 from payment_service.stripe_service import (
     create_stripe_checkout_session,
+    get_session_payment_status,
     StripeSessionError
 )
 
 from payment_service.schema_descriptions import (
     payment_list_schema,
     payment_retrieve_schema,
+    payment_checkout_schema,
     start_payment_schema,
     payment_success_schema,
     payment_cancel_schema,
@@ -58,6 +66,17 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return Payment.objects.all()
         return Payment.objects.filter(borrowing__user=user)
 
+    @action(detail=True, methods=["get"], url_path="checkout")
+    @payment_checkout_schema
+    def checkout(self, request, pk=None):
+        payment = self.get_object()
+        return Response({
+            "payment_id": payment.id,
+            "status": payment.status,
+            "ready": bool(payment.session_url),
+            "checkout_url": payment.session_url or None,
+        })
+
 
 class StartPaymentView(APIView):
     permission_classes = [IsAuthenticated]
@@ -118,44 +137,35 @@ class PaymentSuccessView(APIView):
         ):
             return Response({"detail": "Not allowed."}, status=403)
 
+        paid_response = Response({
+            "status": "success",
+            "message": "Payment completed successfully"
+        })
+        pending_response = Response({
+            "status": "pending",
+            "message": "Payment is still pending"
+        })
+
+        if payment.status == Payment.Status.PAID:
+            return paid_response
+        if payment.status == Payment.Status.EXPIRED:
+            return Response({
+                "status": "expired",
+                "message": "Payment session has expired"
+            })
+        if not payment.session_id:
+            return pending_response
+
         try:
-            session = stripe.checkout.Session.retrieve(payment.session_id)
-            if session.payment_status == 'paid':
-                payment.status = Payment.Status.PAID
-                payment.save()
-
-                if (
-                        payment.type == Payment.Type.PAYMENT
-                        and not payment.borrowing.actual_return_date
-                ):
-                    borrowing = payment.borrowing
-                    borrowing.actual_return_date = datetime.now(timezone.utc)
-                    borrowing.save()
-                    book = borrowing.book
-                    book.inventory += 1
-                    book.save()
-
-                message = (
-                    f"Payment completed successfully!\n"
-                    f"Borrowing ID: #{payment.borrowing.id}\n"
-                    f"Amount: ${payment.money_to_pay}\n"
-                    f"Type: {payment.type}\n"
-                    f"Date: {payment.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
-                )
-                send_telegram_message(message)
-
-                return Response({
-                    "status": "success",
-                    "message": "Payment completed successfully"
-                })
-            else:
-                return Response({
-                    "status": "pending",
-                    "message": "Payment is still pending"
-                })
+            payment_status = get_session_payment_status(payment.session_id)
         except stripe.error.StripeError as e:
             return Response({"error": str(e)}, status=400)
 
+        if payment_status == 'paid':
+            payment.mark_paid()
+            return paid_response
+        return pending_response
+
 
 class PaymentCancelView(APIView):
     permission_classes = [IsAuthenticated]
@@ -188,16 +198,26 @@ class StripeWebhookView(APIView):
         except stripe.error.SignatureVerificationError:
             return HttpResponse(status=400)
 
-        if event['type'] == 'checkout.session.completed':
-            session = event['data']['object']
-            session_id = session.get('id')
-
-            try:
-                payment = Payment.objects.get(session_id=session_id)
-                payment.status = Payment.Status.PAID
-                payment.save()
-            except Payment.DoesNotExist:
-                return HttpResponse(status=404)
+        if event['type'] not in HANDLED_STRIPE_EVENTS:
+            return HttpResponse(status=200)
+
+        session_id = event['data']['object']['id']
+        with transaction.atomic():
+            _, created = StripeEvent.objects.get_or_create(
+                event_id=event['id'],
+                defaults={
+                    "type": event['type'],
+                    "session_id": session_id,
+                    "payload": json.loads(payload),
+                    "created": datetime.fromtimestamp(
+                        event['created'], tz=timezone.utc
+                    ),
+                }
+            )
+            if created:
+                transaction.on_commit(
+                    lambda: process_stripe_events.delay(session_id)
+                )
 
         return HttpResponse(status=200)
 
@@ -0,0 +1,29 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from telegram_bot.models import DeadLetter
+
+
+@admin.register(DeadLetter)
+class DeadLetterAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "chat_id",
+        "dedupe_key",
+        "attempts",
+        "next_attempt_at",
+        "delivered_at",
+        "created_at",
+    )
+    list_filter = ("delivered_at", "created_at")
+    search_fields = ("chat_id", "dedupe_key", "error")
+    readonly_fields = ("created_at", "updated_at")
+    actions = ("retry_now",)
+
+    @admin.action(description="Retry selected messages now")
+    def retry_now(self, request, queryset):
+        updated = queryset.filter(delivered_at__isnull=True).update(
+            next_attempt_at=timezone.now(),
+            updated_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} messages queued for retry.")
@@ -0,0 +1,45 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from telegram_bot.telegram import TelegramAPIError, client
+
+
+class Command(BaseCommand):
+    help = "Register the webhook URL and secret token with Telegram."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "url",
+            nargs="?",
+            default=os.getenv("TELEGRAM_WEBHOOK_URL"),
+            help="Public URL of the /api/telegram/webhook/ endpoint, "
+                 "TELEGRAM_WEBHOOK_URL by default",
+        )
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Remove the webhook and go back to polling",
+        )
+
+    def handle(self, *args, **options):
+        if options["delete"]:
+            method, payload = "deleteWebhook", {}
+        else:
+            if not options["url"]:
+                raise CommandError("Pass the webhook URL.")
+            if not settings.TELEGRAM_WEBHOOK_SECRET:
+                raise CommandError("TELEGRAM_WEBHOOK_SECRET is not set.")
+            method, payload = "setWebhook", {
+                "url": options["url"],
+                "secret_token": settings.TELEGRAM_WEBHOOK_SECRET,
+                "allowed_updates": ["message"],
+            }
+
+        try:
+            client.call(method, payload)
+        except TelegramAPIError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"{method} succeeded."))
@@ -0,0 +1,80 @@
+from django.db import models
+
+
+class PollingOffset(models.Model):
+    """
+    Next ``getUpdates`` offset of a polling bot, saved after every
+    processed batch so a restart does not replay old updates.
+    """
+
+    bot = models.CharField(
+        max_length=64,
+        unique=True
+    )
+    offset = models.BigIntegerField()
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+
+    def __str__(self):
+        return f"{self.bot}: {self.offset}"
+
+
+class DeadLetter(models.Model):
+    """
+    Telegram message that could not be delivered by its Celery task.
+
+    ``retry_dead_letters`` sends it again once ``next_attempt_at`` has
+    passed, backing off exponentially, until it is delivered or
+    ``DEAD_LETTER_MAX_ATTEMPTS`` is reached.
+    """
+
+    chat_id = models.CharField(
+        max_length=64
+    )
+    text = models.TextField()
+    dedupe_key = models.CharField(
+        max_length=255,
+        blank=True
+    )
+    error = models.TextField()
+    attempts = models.PositiveIntegerField(
+        default=1
+    )
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    delivered_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+
+    class Meta:
+        ordering = ("-id",)
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(
+                    delivered_at__isnull=True,
+                    next_attempt_at__isnull=False
+                ),
+                name="dead_letter_due_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedupe_key"],
+                condition=~models.Q(dedupe_key=""),
+                name="dead_letter_dedupe_key_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Dead letter #{self.id} to {self.chat_id}"
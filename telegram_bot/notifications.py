@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from outbox.service import build_telegram_message, publish_many
+
+
+@dataclass
+class Notification:
+    user_id: int
+    text: str
+    dedupe_key: str
+
+
+def user_dedupe_key(dedupe_key: str) -> str:
+    """Key of the direct copy of an event that also goes to staff"""
+    return f"{dedupe_key}-user"
+
+
+def resolve_chat_ids(user_ids) -> dict:
+    """Map users to their linked Telegram chats with one query"""
+    return dict(
+        get_user_model().objects.filter(
+            id__in=set(user_ids),
+            telegram_id__isnull=False
+        ).values_list("id", "telegram_id")
+    )
+
+
+def build_user_messages(notifications) -> list:
+    """
+    Build outbox messages for one batch of notifications.
+
+    Users without a linked Telegram account are skipped.
+    """
+    chat_ids = resolve_chat_ids(
+        notification.user_id for notification in notifications
+    )
+    return [
+        build_telegram_message(
+            notification.text,
+            notification.dedupe_key,
+            chat_id=chat_ids[notification.user_id]
+        )
+        for notification in notifications
+        if notification.user_id in chat_ids
+    ]
+
+
+def notify_users(notifications, batch_size: int = None) -> int:
+    """
+    Queue direct messages to each user's own Telegram chat.
+
+    Recipients are resolved with one query and stored with one outbox
+    INSERT per batch. Call it inside the transaction that records the
+    events, like ``publish_many``.
+    Args:
+        notifications: Iterable of ``Notification``
+        batch_size: Notifications resolved per query
+    Returns:
+        int: Number of messages queued
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    notifications = iter(notifications)
+    queued = 0
+    while batch := list(islice(notifications, batch_size)):
+        messages = build_user_messages(batch)
+        publish_many(messages)
+        queued += len(messages)
+    return queued
+
+
+def build_user_message(user, text: str, dedupe_key: str):
+    """
+    Build a direct message for an already loaded user.
+    Returns:
+        OutboxMessage or None if the user has not linked Telegram
+    """
+    if not user.telegram_id:
+        return None
+    return build_telegram_message(text, dedupe_key, chat_id=user.telegram_id)
@@ -0,0 +1,114 @@
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from telegram_bot.models import PollingOffset
+from telegram_bot.telegram import TELEGRAM_TOKEN, TelegramAPIError, client
+from telegram_bot.webhook_handlers import handle_telegram_update
+
+logger = logging.getLogger(__name__)
+
+# Waits after a failed getUpdates call, doubled up to the maximum
+ERROR_BACKOFF = 1
+MAX_ERROR_BACKOFF = 60
+
+
+def group_by_chat(updates) -> dict:
+    """Split a batch into per-chat lists, keeping the update order"""
+    chats = defaultdict(list)
+    for update in updates:
+        chat = update.get("message", {}).get("chat", {})
+        chats[chat.get("id")].append(update)
+    return chats
+
+
+def process_chat_updates(updates):
+    """Handle one chat's updates in order on a worker thread"""
+    close_old_connections()
+    try:
+        for update in updates:
+            try:
+                handle_telegram_update(update)
+            except Exception:
+                logger.exception(
+                    "Failed to process update %s", update["update_id"]
+                )
+    finally:
+        close_old_connections()
+
+
+class UpdatePoller:
+    """
+    Long-poll ``getUpdates`` and hand each batch to a thread pool.
+
+    Updates of one chat run in order on a single worker, different
+    chats run concurrently. The next offset is saved once the whole
+    batch is done, so a restart resumes after the last finished batch.
+    """
+
+    def __init__(self, telegram_client=client, workers: int = None,
+                 poll_timeout: int = None, bot: str = None):
+        self.client = telegram_client
+        self.workers = workers or settings.TELEGRAM_POLLING_WORKERS
+        self.poll_timeout = poll_timeout or settings.TELEGRAM_POLL_TIMEOUT
+        self.bot = bot or (TELEGRAM_TOKEN or "default").split(":")[0]
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="telegram-update"
+        )
+        self.offset = self.load_offset()
+
+    def load_offset(self):
+        return PollingOffset.objects.filter(
+            bot=self.bot
+        ).values_list("offset", flat=True).first()
+
+    def save_offset(self, offset: int):
+        with transaction.atomic():
+            PollingOffset.objects.update_or_create(
+                bot=self.bot,
+                defaults={"offset": offset}
+            )
+        self.offset = offset
+
+    def get_updates(self) -> list:
+        return self.client.call(
+            "getUpdates",
+            {
+                "offset": self.offset,
+                "timeout": self.poll_timeout,
+                "allowed_updates": ["message"],
+            },
+            read_timeout=self.poll_timeout + 5
+        )
+
+    def process_batch(self, updates):
+        if not updates:
+            return
+
+        futures = [
+            self.executor.submit(process_chat_updates, chat_updates)
+            for chat_updates in group_by_chat(updates).values()
+        ]
+        for future in futures:
+            future.result()
+        self.save_offset(updates[-1]["update_id"] + 1)
+
+    def run_once(self):
+        self.process_batch(self.get_updates())
+
+    def run_forever(self):
+        backoff = ERROR_BACKOFF
+        while True:
+            try:
+                self.run_once()
+            except TelegramAPIError as e:
+                logger.warning("getUpdates failed: %s", e)
+                time.sleep(e.retry_after or backoff)
+                backoff = min(backoff * 2, MAX_ERROR_BACKOFF)
+            else:
+                backoff = ERROR_BACKOFF
@@ -0,0 +1,128 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Holds up to ``capacity`` tokens and refills ``rate`` tokens per
+    second. ``acquire`` blocks until a token is free, so bursts pass
+    straight through and sustained traffic is held at ``rate``.
+    """
+
+    def __init__(
+            self,
+            rate: float,
+            capacity: int,
+            clock=time.monotonic,
+            sleep=time.sleep
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(capacity)
+        self.updated_at = clock()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """
+        Take a token if one is free.
+        Returns:
+            float: 0 if a token was taken, else seconds to wait
+        """
+        with self.lock:
+            now = self.clock()
+            if now < self.paused_until:
+                return self.paused_until - now
+
+            elapsed = now - self.updated_at
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> None:
+        while wait := self.try_acquire():
+            self.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back, e.g. for a 429 ``retry_after``."""
+        with self.lock:
+            now = self.clock()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 0.0
+            self.updated_at = self.paused_until
+
+
+class SharedRateLimiter:
+    """
+    Rate limit shared by every process through the Django cache.
+
+    Calls are counted in windows of ``period`` seconds with
+    ``cache.incr``, so all workers using the same Redis stay under
+    ``rate`` calls per window together. A ``pause`` is stored in the
+    cache too and holds back every process.
+    """
+
+    def __init__(
+            self,
+            key: str,
+            rate: int,
+            period: int = 1,
+            clock=time.time,
+            sleep=time.sleep
+    ):
+        self.key = key
+        self.rate = rate
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+
+    @property
+    def paused_key(self) -> str:
+        return f"{self.key}:paused_until"
+
+    def try_acquire(self) -> float:
+        """
+        Take a slot in the current window if one is free.
+        Returns:
+            float: 0 if a slot was taken, else seconds to wait
+        """
+        now = self.clock()
+        paused_until = cache.get(self.paused_key)
+        if paused_until and now < paused_until:
+            return paused_until - now
+
+        window = int(now // self.period)
+        window_key = f"{self.key}:{window}"
+        window_end = (window + 1) * self.period
+        cache.add(window_key, 0, timeout=self.period + 1)
+        try:
+            count = cache.incr(window_key)
+        except ValueError:
+            # The window expired between add and incr
+            return window_end - now
+        if count <= self.rate:
+            return 0.0
+        return window_end - now
+
+    def acquire(self) -> None:
+        while wait := self.try_acquire():
+            self.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every process back, e.g. for a 429 ``retry_after``."""
+        paused_until = self.clock() + seconds
+        cache.set(
+            self.paused_key,
+            max(paused_until, cache.get(self.paused_key) or 0),
+            timeout=int(seconds) + 1
+        )
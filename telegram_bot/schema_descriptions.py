@@ -8,3 +8,14 @@ go_to_bot_schema = extend_schema(
                 "bot for the authenticated user.",
     responses={200: Response}
 )
+
+
+telegram_webhook_schema = extend_schema(
+    summary="Receive Telegram bot updates",
+    description="Endpoint registered with Telegram's setWebhook. "
+                "Requests must carry the configured "
+                "X-Telegram-Bot-Api-Secret-Token header; the update "
+                "is queued for a Celery worker.",
+    request=dict,
+    responses={200: None, 403: None}
+)
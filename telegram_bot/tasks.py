@@ -0,0 +1,183 @@
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from telegram_bot.models import DeadLetter
+from telegram_bot.telegram import CHAT_ID, send_telegram_message
+from telegram_bot.webhook_handlers import handle_telegram_update
+
+logger = logging.getLogger(__name__)
+
+
+def dead_letter_backoff(attempts: int):
+    return min(
+        settings.DEAD_LETTER_RETRY_BASE * 2 ** (attempts - 1),
+        settings.DEAD_LETTER_RETRY_MAX
+    )
+
+
+def next_dead_letter_attempt(error, attempts: int):
+    """
+    When to send a dead letter again, or ``None`` to wait for an admin.
+
+    Errors Telegram will keep returning, e.g. a blocked bot or an unknown
+    chat, are not retried automatically.
+    """
+    if (
+            not getattr(error, "retryable", True)
+            or attempts >= settings.DEAD_LETTER_MAX_ATTEMPTS
+    ):
+        return None
+    return timezone.now() + dead_letter_backoff(attempts)
+
+
+def record_dead_letter(text, chat_id, dedupe_key, error, attempts):
+    """Store a message its task gave up on; repeats of a key are ignored"""
+    logger.warning(
+        "Dead-lettering Telegram message %s after %s attempts: %s",
+        dedupe_key, attempts, error
+    )
+    DeadLetter.objects.bulk_create([DeadLetter(
+        chat_id=str(chat_id),
+        text=text,
+        dedupe_key=dedupe_key or "",
+        error=str(error),
+        attempts=attempts,
+        next_attempt_at=next_dead_letter_attempt(error, attempts),
+    )], ignore_conflicts=True)
+
+
+@shared_task(
+    bind=True,
+    max_retries=5,
+    rate_limit=settings.TELEGRAM_TASK_RATE_LIMIT
+)
+def send_telegram_message_task(
+        self,
+        text: str,
+        chat_id: str = None,
+        dedupe_key: str = None
+):
+    """
+    Send a Telegram message from a worker, retrying on failure.
+
+    A 429 is retried after the ``retry_after`` Telegram asked for, other
+    errors with exponential backoff. Messages Telegram refuses outright
+    or that still fail after ``max_retries`` go to the dead-letter store
+    instead of being lost. The outbox relays at least once, so
+    a message that carries a ``dedupe_key`` is sent only the first time
+    the key is seen.
+    """
+    cache_key = f"telegram:sent:{dedupe_key}" if dedupe_key else None
+    if cache_key and not cache.add(
+            cache_key, True, settings.OUTBOX_DEDUPE_TIMEOUT
+    ):
+        return
+
+    try:
+        send_telegram_message(text, chat_id or CHAT_ID)
+    except Exception as e:
+        if cache_key:
+            cache.delete(cache_key)
+        if (
+                not getattr(e, "retryable", True)
+                or self.request.retries >= self.max_retries
+        ):
+            record_dead_letter(
+                text,
+                chat_id or CHAT_ID,
+                dedupe_key,
+                error=e,
+                attempts=self.request.retries + 1
+            )
+            return
+        countdown = getattr(e, "retry_after", None)
+        raise self.retry(
+            exc=e,
+            countdown=countdown or 2 ** self.request.retries
+        )
+
+
+@shared_task
+def process_telegram_update(update: dict):
+    """
+    Handle an update delivered to the webhook.
+
+    Telegram delivers again when it does not get a 200 in time, so each
+    ``update_id`` is handled once.
+    """
+    if not cache.add(
+            f"telegram:update:{update.get('update_id')}",
+            True,
+            settings.OUTBOX_DEDUPE_TIMEOUT
+    ):
+        return
+    handle_telegram_update(update)
+
+
+@shared_task
+def retry_dead_letters(batch_size: int = None) -> dict:
+    """
+    Send due dead letters again.
+
+    A batch is claimed under ``SKIP LOCKED`` by moving its next attempt
+    ``DEAD_LETTER_LEASE`` ahead, then sent outside the transaction.
+    Failures are retried with exponential backoff until
+    ``DEAD_LETTER_MAX_ATTEMPTS``; ones that cannot succeed by retrying
+    wait for the admin "retry now" action. After a 429 the rest of the
+    batch is left for when its lease runs out.
+    Returns:
+        dict: Numbers of delivered and failed letters
+    """
+    batch_size = batch_size or settings.DEAD_LETTER_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        letters = list(
+            DeadLetter.objects.filter(
+                delivered_at__isnull=True,
+                next_attempt_at__lte=now
+            ).select_for_update(
+                skip_locked=True
+            ).order_by("next_attempt_at")[:batch_size]
+        )
+        DeadLetter.objects.filter(
+            pk__in=[letter.pk for letter in letters]
+        ).update(
+            next_attempt_at=now + settings.DEAD_LETTER_LEASE,
+            updated_at=Now()
+        )
+
+    delivered = []
+    failed = []
+    for letter in letters:
+        try:
+            send_telegram_message(letter.text, letter.chat_id)
+        except Exception as e:
+            letter.attempts += 1
+            letter.error = str(e)
+            letter.updated_at = timezone.now()
+            letter.next_attempt_at = next_dead_letter_attempt(
+                e, letter.attempts
+            )
+            failed.append(letter)
+            if getattr(e, "retry_after", None):
+                break
+        else:
+            delivered.append(letter.pk)
+
+    DeadLetter.objects.filter(pk__in=delivered).update(
+        attempts=F("attempts") + 1,
+        delivered_at=Now(),
+        next_attempt_at=None,
+        updated_at=Now()
+    )
+    DeadLetter.objects.bulk_update(
+        failed, ["attempts", "error", "next_attempt_at", "updated_at"]
+    )
+    return {"delivered": len(delivered), "failed": len(failed)}
@@ -1,6 +1,14 @@
 import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from telegram_bot.rate_limit import SharedRateLimiter, TokenBucket
 
 load_dotenv()
 
@@ -8,15 +16,207 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.getenv("CHAT_ID")
 GROUP_INVITE_LINK = os.getenv("TELEGRAM_GROUP_INVITE_LINK")
 
+# Telegram rejects longer message texts
+MESSAGE_LIMIT = 4096
+# Telegram allows about 30 messages per second in total, one per second
+# into a private chat and 20 per minute into a group. The total and
+# the group limits are shared by every process through the cache, as
+# every staff notification goes to the same group; private chat limits
+# are kept in each process for the chats it recently messaged.
+GLOBAL_RATE_PER_SECOND = 30
+MAX_CHAT_LIMITERS = 10_000
+PRIVATE_CHAT_RATE_PER_SECOND = 1
+GROUP_RATE_PER_MINUTE = int(os.getenv("TELEGRAM_RATE_LIMIT_PER_MINUTE") or 20)
 
-def send_telegram_message(text: str, chat_id: str = CHAT_ID):
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+MAX_RETRIES = 3
+# Longer waits are left to the caller, e.g. a Celery retry
+MAX_INLINE_RETRY_AFTER = 5
+
+
+class TelegramAPIError(Exception):
+    """Raised when Telegram rejects a request"""
+
+    def __init__(self, message: str, retry_after: int = None,
+                 status_code: int = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        """False when Telegram refused the request itself, e.g. a
+        blocked bot or an unknown chat"""
+        return (
+            self.status_code is None
+            or self.status_code == 429
+            or self.status_code >= 500
+        )
+
+
+def get_retry_after(response) -> int:
+    try:
+        return response.json()["parameters"]["retry_after"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class TelegramClient:
+    """
+    Shared Bot API client.
+
+    Keeps connections alive in a pooled ``requests.Session``, applies
+    connect and read timeouts, waits for the bot-wide limit and a
+    per-chat token bucket before every message and retries 429, 5xx
+    and network errors with backoff. Counters are available through
+    ``stats()``.
+
+    The bot-wide and the group chat limits live in the cache, so all
+    workers together stay under ``GLOBAL_RATE_PER_SECOND`` and
+    ``GROUP_RATE_PER_MINUTE``. Per-chat limiters are held for the
+    ``MAX_CHAT_LIMITERS`` most recently used chats; an evicted private
+    chat bucket has been idle the longest and is most likely full anyway.
+    """
+
+    def __init__(self, token: str, pool_size: int = 10):
+        self.base_url = f"https://api.telegram.org/bot{token}/"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+
+        self.rate_key = f"telegram:rate:{(token or '').split(':')[0]}"
+        self.global_limiter = SharedRateLimiter(
+            key=self.rate_key,
+            rate=GLOBAL_RATE_PER_SECOND
+        )
+        self.chat_limiters = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "errors": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "latency_seconds": 0.0,
+        }
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    response = requests.post(url, json={
-        "chat_id": chat_id,
-        "text": text,
-        "parse_mode": "HTML",
-    })
+    def get_chat_limiter(self, chat_id) -> TokenBucket | SharedRateLimiter:
+        with self.lock:
+            limiter = self.chat_limiters.get(str(chat_id))
+            if limiter is not None:
+                self.chat_limiters.move_to_end(str(chat_id))
+            else:
+                if str(chat_id).startswith("-"):
+                    limiter = SharedRateLimiter(
+                        key=f"{self.rate_key}:chat:{chat_id}",
+                        rate=GROUP_RATE_PER_MINUTE,
+                        period=60
+                    )
+                else:
+                    limiter = TokenBucket(
+                        rate=PRIVATE_CHAT_RATE_PER_SECOND,
+                        capacity=PRIVATE_CHAT_RATE_PER_SECOND
+                    )
+                self.chat_limiters[str(chat_id)] = limiter
+                if len(self.chat_limiters) > MAX_CHAT_LIMITERS:
+                    self.chat_limiters.popitem(last=False)
+            return limiter
 
-    if not response.ok:
-        raise Exception(f"Failed to send message: {response.text}")
+    def count(self, **increments) -> None:
+        with self.lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.counters)
+        requests_made = stats["requests"] or 1
+        stats["average_latency_seconds"] = round(
+            stats["latency_seconds"] / requests_made, 4
+        )
+        return stats
+
+    def backoff(self, attempt: int) -> float:
+        return min(2 ** attempt, 30) * (0.5 + random.random() / 2)
+
+    def call(self, method: str, payload: dict, read_timeout=READ_TIMEOUT,
+             limiters=()):
+        """
+        Call a Bot API method and return its ``result``.
+        Raises:
+            TelegramAPIError: If Telegram rejects the request or it
+                still fails after ``MAX_RETRIES`` retries
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            for limiter in limiters:
+                limiter.acquire()
+
+            started = time.monotonic()
+            try:
+                response = self.session.post(
+                    self.base_url + method,
+                    json=payload,
+                    timeout=(CONNECT_TIMEOUT, read_timeout)
+                )
+            except requests.RequestException as e:
+                response = None
+                error = TelegramAPIError(f"Telegram request failed: {e}")
+            self.count(
+                requests=1,
+                latency_seconds=time.monotonic() - started
+            )
+
+            if response is not None and response.ok:
+                return response.json().get("result")
+
+            delay = self.backoff(attempt)
+            if response is not None:
+                retry_after = None
+                if response.status_code == 429:
+                    self.count(rate_limited=1)
+                    retry_after = get_retry_after(response)
+                    if retry_after:
+                        for limiter in limiters:
+                            limiter.pause(retry_after)
+                        delay = retry_after
+                error = TelegramAPIError(
+                    f"Failed to call {method}: {response.text}",
+                    retry_after=retry_after,
+                    status_code=response.status_code
+                )
+                if (
+                        response.status_code != 429
+                        and response.status_code < 500
+                ):
+                    break
+
+            if attempt == MAX_RETRIES or delay > MAX_INLINE_RETRY_AFTER:
+                break
+            self.count(retries=1)
+            time.sleep(delay)
+
+        self.count(errors=1)
+        raise error
+
+    def send_message(self, text: str, chat_id) -> dict:
+        return self.call(
+            "sendMessage",
+            {"chat_id": chat_id, "text": text, "parse_mode": "HTML"},
+            limiters=(self.global_limiter, self.get_chat_limiter(chat_id)),
+        )
+
+
+client = TelegramClient(TELEGRAM_TOKEN)
+
+
+def send_telegram_message(text: str, chat_id: str = CHAT_ID):
+    """
+    Send a message through the shared client.
+    Raises:
+        TelegramAPIError: If Telegram rejects the message. After a 429
+            ``retry_after`` says how long to wait.
+    """
+    return client.send_message(text, chat_id)
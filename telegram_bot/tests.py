@@ -1,3 +1,481 @@
-from django.test import TestCase
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+import threading
+
+import requests
+from celery.exceptions import Retry
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from outbox.models import OutboxMessage
+from telegram_bot.models import DeadLetter, PollingOffset
+from telegram_bot.notifications import Notification, notify_users
+from telegram_bot.polling import UpdatePoller
+from telegram_bot.rate_limit import SharedRateLimiter, TokenBucket
+from telegram_bot.tasks import (
+    process_telegram_update,
+    retry_dead_letters,
+    send_telegram_message_task,
+)
+from telegram_bot.telegram import (
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    TelegramAPIError,
+    TelegramClient,
+)
+from telegram_bot.utils import handle_start_command, linked_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TokenBucketTest(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(
+            rate=1, capacity=2, clock=self.clock, sleep=self.clock.sleep
+        )
+
+    def test_burst_then_rate(self):
+        self.assertEqual(self.bucket.try_acquire(), 0)
+        self.assertEqual(self.bucket.try_acquire(), 0)
+        self.assertEqual(self.bucket.try_acquire(), 1)
+
+        self.bucket.acquire()
+        self.assertEqual(self.clock.now, 1)
+
+    def test_pause_holds_every_caller(self):
+        self.bucket.pause(30)
+        self.assertEqual(self.bucket.try_acquire(), 30)
+
+        self.bucket.acquire()
+        self.assertEqual(self.clock.now, 31)
+
+
+class SharedRateLimiterTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.clock = FakeClock()
+        self.clock.now = 1000.25
+
+    def limiter(self):
+        return SharedRateLimiter(
+            "test:rate", rate=2, clock=self.clock, sleep=self.clock.sleep
+        )
+
+    def test_processes_share_one_window(self):
+        first, second = self.limiter(), self.limiter()
+
+        self.assertEqual(first.try_acquire(), 0)
+        self.assertEqual(second.try_acquire(), 0)
+        self.assertEqual(first.try_acquire(), 0.75)
+
+        second.acquire()
+        self.assertEqual(self.clock.now, 1001)
+
+    def test_pause_holds_every_process(self):
+        self.limiter().pause(30)
+
+        self.assertEqual(self.limiter().try_acquire(), 30)
+
+
+def api_response(status_code, body=None):
+    response = MagicMock(
+        ok=status_code == 200, status_code=status_code, text=str(body)
+    )
+    response.json.return_value = body or {}
+    return response
+
+
+@patch("telegram_bot.telegram.time.sleep")
+class TelegramClientTest(SimpleTestCase):
+    def setUp(self):
+        self.client = TelegramClient("token")
+        self.client.session = MagicMock()
+        self.client.global_limiter = MagicMock()
+        self.chat_limiter = MagicMock()
+        self.client.chat_limiters["123"] = self.chat_limiter
+
+    def test_long_retry_after_pauses_limiters_and_raises(self, mock_sleep):
+        self.client.session.post.return_value = api_response(
+            429, {"ok": False, "parameters": {"retry_after": 17}}
+        )
+
+        with self.assertRaises(TelegramAPIError) as error:
+            self.client.send_message("Hi", "123")
+        self.assertEqual(error.exception.retry_after, 17)
+        self.client.global_limiter.pause.assert_called_once_with(17)
+        self.chat_limiter.pause.assert_called_once_with(17)
+        mock_sleep.assert_not_called()
+
+    def test_server_errors_are_retried(self, mock_sleep):
+        self.client.session.post.side_effect = [
+            api_response(502),
+            requests.ConnectionError("reset"),
+            api_response(200, {"ok": True, "result": {"message_id": 1}}),
+        ]
+
+        result = self.client.send_message("Hi", "123")
+
+        self.assertEqual(result, {"message_id": 1})
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(self.chat_limiter.acquire.call_count, 3)
+        self.assertEqual(
+            self.client.session.post.call_args.kwargs["timeout"],
+            (CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+        stats = self.client.stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["errors"], 0)
+
+    def test_client_errors_are_not_retried(self, mock_sleep):
+        self.client.session.post.return_value = api_response(
+            400, {"ok": False, "description": "chat not found"}
+        )
+
+        with self.assertRaises(TelegramAPIError):
+            self.client.send_message("Hi", "123")
+        self.client.session.post.assert_called_once()
+        self.assertEqual(self.client.stats()["errors"], 1)
+
+    @patch("telegram_bot.telegram.MAX_CHAT_LIMITERS", 2)
+    def test_least_recently_used_chat_limiter_evicted(self, mock_sleep):
+        client = TelegramClient("token")
+        first = client.get_chat_limiter(1)
+        client.get_chat_limiter(2)
+        client.get_chat_limiter(1)
+        client.get_chat_limiter(3)
+
+        self.assertEqual(list(client.chat_limiters), ["1", "3"])
+        self.assertIs(client.get_chat_limiter(1), first)
+
+    def test_group_chats_get_the_group_limit(self, mock_sleep):
+        private = TelegramClient("token").get_chat_limiter(42)
+        group = TelegramClient("token").get_chat_limiter(-42)
+
+        self.assertEqual(private.capacity, 1)
+        self.assertEqual((group.rate, group.period), (20, 60))
+
+    @patch("telegram_bot.telegram.GROUP_RATE_PER_MINUTE", 2)
+    def test_group_limit_shared_between_clients(self, mock_sleep):
+        cache.clear()
+        clock = FakeClock()
+        clock.now = 6015.0
+        first = TelegramClient("token").get_chat_limiter(-42)
+        second = TelegramClient("token").get_chat_limiter(-42)
+        first.clock = second.clock = clock
+
+        self.assertEqual(first.try_acquire(), 0)
+        self.assertEqual(second.try_acquire(), 0)
+        self.assertEqual(first.try_acquire(), 45)
+        self.assertEqual(second.try_acquire(), 45)
+
+
+class SendTelegramMessageTest(TestCase):
+    @patch("telegram_bot.tasks.send_telegram_message")
+    def test_task_retries_after_retry_after(self, mock_send):
+        mock_send.side_effect = TelegramAPIError("429", retry_after=17)
+
+        with patch.object(
+                send_telegram_message_task, "retry", side_effect=Retry
+        ) as mock_retry:
+            with self.assertRaises(Retry):
+                send_telegram_message_task.run("Hi", dedupe_key="retry")
+        self.assertEqual(mock_retry.call_args.kwargs["countdown"], 17)
+
+        mock_send.side_effect = None
+        send_telegram_message_task.run("Hi", dedupe_key="retry")
+        self.assertEqual(mock_send.call_count, 2)
+
+
+def start_update(update_id, chat_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "text": "/start",
+            "chat": {"id": chat_id},
+            "from": {"id": chat_id},
+        },
+    }
+
+
+class UpdatePollerTest(TestCase):
+    def setUp(self):
+        self.telegram_client = MagicMock()
+        self.poller = UpdatePoller(
+            telegram_client=self.telegram_client, workers=4, bot="test"
+        )
+
+    @patch("telegram_bot.polling.handle_telegram_update")
+    def test_batch_keeps_chat_order_and_saves_offset(self, mock_process):
+        handled = []
+        lock = threading.Lock()
+
+        def record(update):
+            with lock:
+                handled.append(update["update_id"])
+
+        mock_process.side_effect = record
+        self.telegram_client.call.return_value = [
+            start_update(10, 1),
+            start_update(11, 2),
+            start_update(12, 1),
+            start_update(13, 1),
+        ]
+
+        self.poller.run_once()
+
+        self.assertEqual(sorted(handled), [10, 11, 12, 13])
+        chat_one = [update_id for update_id in handled if update_id != 11]
+        self.assertEqual(chat_one, [10, 12, 13])
+        self.assertEqual(
+            PollingOffset.objects.get(bot="test").offset, 14
+        )
+
+        self.poller.run_once()
+        self.assertEqual(
+            self.telegram_client.call.call_args.args[1]["offset"], 14
+        )
+        self.assertEqual(
+            UpdatePoller(telegram_client=MagicMock(), bot="test").offset, 14
+        )
+
+    @patch("telegram_bot.polling.handle_telegram_update")
+    def test_failed_update_does_not_block_offset(self, mock_process):
+        mock_process.side_effect = [ValueError("boom"), None]
+        self.telegram_client.call.return_value = [
+            start_update(20, 1),
+            start_update(21, 2),
+        ]
+
+        with self.assertLogs("telegram_bot.polling", level="ERROR"):
+            self.poller.run_once()
+
+        self.assertEqual(mock_process.call_count, 2)
+        self.assertEqual(self.poller.offset, 22)
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET="webhook-secret")
+class TelegramWebhookTest(TestCase):
+    url = reverse("telegram_bot:webhook")
+
+    def post(self, token):
+        return self.client.post(
+            self.url,
+            start_update(30, 1),
+            content_type="application/json",
+            HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=token,
+        )
+
+    @patch("telegram_bot.views.process_telegram_update.delay")
+    def test_update_is_queued(self, mock_delay):
+        response = self.post("webhook-secret")
+
+        self.assertEqual(response.status_code, 200)
+        mock_delay.assert_called_once_with(start_update(30, 1))
+
+    @patch("telegram_bot.views.process_telegram_update.delay")
+    def test_wrong_secret_is_rejected(self, mock_delay):
+        response = self.post("guess")
+
+        self.assertEqual(response.status_code, 403)
+        mock_delay.assert_not_called()
+
+    @patch("telegram_bot.tasks.handle_telegram_update")
+    def test_task_handles_each_update_once(self, mock_handle):
+        cache.delete("telegram:update:30")
+
+        process_telegram_update.run(start_update(30, 1))
+        process_telegram_update.run(start_update(30, 1))
+
+        mock_handle.assert_called_once_with(start_update(30, 1))
+
+
+class NotifyUsersTest(TestCase):
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(
+                email=f"user{i}@test.com",
+                password="password",
+                first_name="Test",
+                last_name="User",
+                telegram_id=1000 + i if i % 2 else None,
+            )
+            for i in range(4)
+        ]
+
+    def test_recipients_resolved_per_batch(self):
+        notifications = [
+            Notification(user.id, f"Hi {user.email}", f"hi-{user.id}")
+            for user in self.users
+        ]
+
+        # One user lookup and one outbox INSERT per batch of two
+        with self.assertNumQueries(4):
+            queued = notify_users(notifications, batch_size=2)
+
+        self.assertEqual(queued, 2)
+        self.assertEqual(
+            sorted(
+                OutboxMessage.objects.values_list(
+                    "payload__chat_id", flat=True
+                )
+            ),
+            [1001, 1003]
+        )
+
+
+@patch("telegram_bot.tasks.send_telegram_message")
+class DeadLetterTest(TestCase):
+    def run_task(self, retries=0):
+        send_telegram_message_task.push_request(retries=retries)
+        try:
+            with self.assertLogs("telegram_bot.tasks", level="WARNING"):
+                send_telegram_message_task.run(
+                    "Hi", chat_id="42", dedupe_key="dead"
+                )
+        finally:
+            send_telegram_message_task.pop_request()
+
+    def test_refused_message_is_dead_lettered_at_once(self, mock_send):
+        mock_send.side_effect = TelegramAPIError(
+            "Forbidden: bot was blocked", status_code=403
+        )
+
+        self.run_task()
+
+        letter = DeadLetter.objects.get()
+        self.assertEqual(letter.chat_id, "42")
+        self.assertEqual(letter.attempts, 1)
+        self.assertIn("blocked", letter.error)
+        # Left for the admin "retry now" action
+        self.assertIsNone(letter.next_attempt_at)
+
+    def test_exhausted_retries_are_dead_lettered_once(self, mock_send):
+        mock_send.side_effect = TelegramAPIError(
+            "Bad Gateway", status_code=502
+        )
+
+        self.run_task(retries=5)
+        self.run_task(retries=5)
+
+        letter = DeadLetter.objects.get()
+        self.assertEqual(letter.attempts, 6)
+        self.assertIsNotNone(letter.next_attempt_at)
+
+    def test_retry_stops_on_refused_message(self, mock_send):
+        letter = DeadLetter.objects.create(
+            chat_id="1", text="Hi", error="", next_attempt_at=timezone.now()
+        )
+        mock_send.side_effect = TelegramAPIError(
+            "Bad Request: chat not found", status_code=400
+        )
+
+        retry_dead_letters()
+
+        letter.refresh_from_db()
+        self.assertEqual(letter.attempts, 2)
+        self.assertIn("chat not found", letter.error)
+        self.assertIsNone(letter.next_attempt_at)
+        mock_send.reset_mock()
+        retry_dead_letters()
+        mock_send.assert_not_called()
+
+    def test_retry_delivers_or_backs_off(self, mock_send):
+        due = timezone.now() - timezone.timedelta(seconds=1)
+        delivered = DeadLetter.objects.create(
+            chat_id="1", text="ok", error="", next_attempt_at=due
+        )
+        failing = DeadLetter.objects.create(
+            chat_id="2", text="fail", error="", attempts=2,
+            next_attempt_at=due
+        )
+        last_try = DeadLetter.objects.create(
+            chat_id="3", text="fail", error="", attempts=11,
+            next_attempt_at=due
+        )
+
+        def send(text, chat_id):
+            if text != "ok":
+                raise TelegramAPIError("Server Error", status_code=500)
+
+        mock_send.side_effect = send
+
+        result = retry_dead_letters()
+
+        self.assertEqual(result, {"delivered": 1, "failed": 2})
+        delivered.refresh_from_db()
+        self.assertIsNotNone(delivered.delivered_at)
+        self.assertIsNone(delivered.next_attempt_at)
+        failing.refresh_from_db()
+        self.assertEqual(failing.attempts, 3)
+        self.assertGreater(
+            failing.next_attempt_at,
+            timezone.now() + timezone.timedelta(minutes=3)
+        )
+        last_try.refresh_from_db()
+        self.assertIsNone(last_try.next_attempt_at)
+
+
+@patch("telegram_bot.utils.send_telegram_message")
+class StartCommandTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="reader@test.com",
+            password="password",
+            first_name="Reader",
+            last_name="User",
+        )
+        cache.delete(linked_cache_key(777))
+        cache.delete(linked_cache_key(888))
+
+    def test_link_then_repeat_start_from_cache(self, mock_send):
+        # User lookup and the conditional UPDATE in a savepoint
+        with self.assertNumQueries(4):
+            handle_start_command(1, "reader@test.com", 777)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.telegram_id, 777)
+
+        with self.assertNumQueries(0):
+            handle_start_command(1, "reader@test.com", 777)
+        self.assertIn("Reader", mock_send.call_args.args[0])
+
+    def test_telegram_linked_to_another_account(self, mock_send):
+        get_user_model().objects.create_user(
+            email="other@test.com",
+            password="password",
+            first_name="Other",
+            last_name="User",
+            telegram_id=777,
+        )
+
+        handle_start_command(1, "reader@test.com", 777)
+
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.telegram_id)
+        self.assertIn("іншого акаунту", mock_send.call_args.args[0])
+
+    def test_relinking_drops_cached_link_of_replaced_account(
+            self, mock_send
+    ):
+        handle_start_command(1, "reader@test.com", 777)
+        handle_start_command(2, "reader@test.com", 888)
+
+        self.assertIsNone(cache.get(linked_cache_key(777)))
+        handle_start_command(1, "reader@test.com", 777)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.telegram_id, 777)
+        self.assertIsNone(cache.get(linked_cache_key(888)))
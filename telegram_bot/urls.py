@@ -4,4 +4,9 @@ from telegram_bot import views
 app_name = "telegram_bot"
 urlpatterns = [
     path("go-to-bot/", views.go_to_bot, name="go-to-bot"),
+    path(
+        "webhook/",
+        views.TelegramWebhookView.as_view(),
+        name="webhook"
+    ),
 ]
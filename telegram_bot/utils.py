@@ -1,11 +1,47 @@
 import re
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Exists
+
 from .telegram import send_telegram_message, GROUP_INVITE_LINK
 
 
 User = get_user_model()
 
 
+def linked_cache_key(telegram_user_id: int) -> str:
+    return f"telegram:linked:{telegram_user_id}"
+
+
+def link_telegram_account(user_id: int, telegram_user_id: int) -> bool:
+    """
+    Link a Telegram account to a user with one conditional UPDATE.
+    Returns:
+        bool: False if the Telegram account belongs to another user
+    """
+    taken = User.objects.filter(
+        telegram_id=telegram_user_id
+    ).exclude(
+        pk=user_id
+    )
+    try:
+        with transaction.atomic():
+            return bool(
+                User.objects.filter(
+                    ~Exists(taken),
+                    pk=user_id
+                ).update(
+                    telegram_id=telegram_user_id
+                )
+            )
+    except IntegrityError:
+        # Linked to another account by a concurrent /start
+        return False
+
+
 def handle_start_command(
         chat_id: int,
         email: str,
@@ -21,35 +57,35 @@ def handle_start_command(
         )
         return
 
-    try:
-        user = User.objects.get(
+    cache_key = linked_cache_key(telegram_user_id)
+    linked = cache.get(cache_key)
+    if linked is None or linked["email"] != email:
+        user = User.objects.filter(
             email=email
-        )
-    except User.DoesNotExist:
-        send_telegram_message(
-            "Користувача з такою email-адресою не знайдено.",
-            chat_id
-        )
-        return
+        ).values("id", "first_name", "telegram_id").first()
 
-    existing_user = User.objects.filter(
-        telegram_id=telegram_user_id
-    ).exclude(
-        email=email
-    ).first()
+        if user is None:
+            send_telegram_message(
+                "Користувача з такою email-адресою не знайдено.",
+                chat_id
+            )
+            return
 
-    if existing_user:
-        send_telegram_message(
-            "❌ Цей Telegram вже прив’язано до іншого акаунту.",
-            chat_id
-        )
-        return
+        if not link_telegram_account(user["id"], telegram_user_id):
+            send_telegram_message(
+                "❌ Цей Telegram вже прив’язано до іншого акаунту.",
+                chat_id
+            )
+            return
 
-    user.telegram_id = telegram_user_id
-    user.save()
+        if user["telegram_id"] not in (None, telegram_user_id):
+            # The replaced account must not be greeted from the cache
+            cache.delete(linked_cache_key(user["telegram_id"]))
+        linked = {"email": email, "first_name": user["first_name"]}
+        cache.set(cache_key, linked, settings.TELEGRAM_LINK_CACHE_TIMEOUT)
 
     send_telegram_message(
-        f"Привіт, {user.first_name}! "
+        f"Привіт, {linked['first_name']}! "
         f"Ось посилання на приватний чат: {GROUP_INVITE_LINK}",
         chat_id
     )
@@ -1,9 +1,18 @@
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-import os
+from rest_framework.views import APIView
 
-from telegram_bot.schema_descriptions import go_to_bot_schema
+from telegram_bot.schema_descriptions import (
+    go_to_bot_schema,
+    telegram_webhook_schema,
+)
+from telegram_bot.tasks import process_telegram_update
 
 
 @go_to_bot_schema
@@ -15,3 +24,19 @@ def go_to_bot(request):
         "BorrowingBookBot"
     )
     return Response({"bot_link": f"https://t.me/{telegram_bot_username}"})
+
+
+class TelegramWebhookView(APIView):
+    authentication_classes = []
+    permission_classes = []
+    throttle_classes = []
+
+    @telegram_webhook_schema
+    def post(self, request):
+        secret = settings.TELEGRAM_WEBHOOK_SECRET
+        token = request.META.get("HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN", "")
+        if not secret or not hmac.compare_digest(token, secret):
+            return HttpResponse(status=403)
+
+        process_telegram_update.delay(request.data)
+        return HttpResponse(status=200)
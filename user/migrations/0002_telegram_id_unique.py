@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:08
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def unlink_duplicate_telegram_ids(apps, schema_editor):
+    """
+    Keep a shared telegram_id only on the oldest account using it, the
+    one with the lowest id. When each account linked it is not recorded.
+    """
+    User = apps.get_model("user", "User")
+    duplicates = User.objects.filter(
+        telegram_id__isnull=False
+    ).values("telegram_id").annotate(
+        accounts=Count("id"),
+        oldest_id=Min("id")
+    ).filter(accounts__gt=1)
+    for duplicate in duplicates:
+        User.objects.filter(
+            telegram_id=duplicate["telegram_id"]
+        ).exclude(pk=duplicate["oldest_id"]).update(telegram_id=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            unlink_duplicate_telegram_ids, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(condition=models.Q(('telegram_id__isnull', False)), fields=('telegram_id',), name='user_telegram_id_unique'),
+        ),
+    ]
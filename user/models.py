@@ -89,3 +89,13 @@ class User(AbstractUser):
     REQUIRED_FIELDS = []
 
     objects = UserManager()
+
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Also the index behind the /start lookup by telegram_id
+            models.UniqueConstraint(
+                fields=["telegram_id"],
+                condition=models.Q(telegram_id__isnull=False),
+                name="user_telegram_id_unique"
+            ),
+        ]